@@ -1,4 +1,4 @@
-import struct, base64, config
+import struct, base64, math, re, functools, config
 
 def safe_float(val, default=0.0):
     try: return float(val)
@@ -26,10 +26,148 @@ def write_varint(buf, val):
         zigzag >>= 7
     buf.append(zigzag)
 
-def bake_channel(keyframes, channel_name):
+def read_varint(data, cursor):
+    result, shift = 0, 0
+    while True:
+        b = data[cursor]; cursor += 1
+        result |= (b & 0x7F) << shift
+        shift += 7
+        if not b & 0x80: break
+    return (result >> 1) ^ -(result & 1), cursor
+
+# Molang: each distinct expression is compiled once into a python callable of anim time (seconds)
+
+_rad = math.radians
+_deg = math.degrees
+MOLANG_FUNCS = {
+    'math.abs': abs, 'math.sqrt': lambda a: math.sqrt(max(a, 0)),
+    'math.sin': lambda a: math.sin(_rad(a)), 'math.cos': lambda a: math.cos(_rad(a)),
+    'math.asin': lambda a: _deg(math.asin(max(-1, min(1, a)))), 'math.acos': lambda a: _deg(math.acos(max(-1, min(1, a)))),
+    'math.atan': lambda a: _deg(math.atan(a)), 'math.atan2': lambda a, b: _deg(math.atan2(a, b)),
+    'math.exp': math.exp, 'math.ln': lambda a: math.log(a) if a > 0 else 0.0, 'math.pow': lambda a, b: a ** b,
+    'math.floor': math.floor, 'math.ceil': math.ceil, 'math.round': lambda a: math.floor(a + 0.5), 'math.trunc': math.trunc,
+    'math.min': min, 'math.max': max, 'math.mod': lambda a, b: math.fmod(a, b) if b else 0.0,
+    'math.clamp': lambda v, a, b: max(a, min(b, v)), 'math.lerp': lambda a, b, t: a + (b - a) * t,
+    'math.lerprotate': lambda a, b, t: a + ((b - a + 180) % 360 - 180) * t,
+    'math.hermite_blend': lambda t: 3 * t * t - 2 * t * t * t,
+    # Baking has to be deterministic, so random picks the middle of its range
+    'math.random': lambda a, b: (a + b) / 2, 'math.random_integer': lambda a, b: math.floor((a + b) / 2),
+}
+MOLANG_CONSTS = {'math.pi': math.pi, 'true': 1.0, 'false': 0.0}
+MOLANG_TIME = {'query.anim_time', 'q.anim_time', 'query.life_time', 'q.life_time'}
+
+_TOKEN = re.compile(r'\s*(?:(\d+\.?\d*|\.\d+)|([a-z_][a-z0-9_.]*)|(&&|\|\||==|!=|<=|>=|[-+*/()<>!?:,]))')
+_BINARY = {'||': 2, '&&': 3, '==': 4, '!=': 4, '<': 5, '<=': 5, '>': 5, '>=': 5, '+': 6, '-': 6, '*': 7, '/': 7}
+
+def _div(a, b): return a / b if b else 0.0
+
+def _molang_source(expr):
+    expr = expr.lower().strip().rstrip(';')
+    if expr.startswith('return '): expr = expr[7:]
+
+    tokens, pos = [], 0
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if not m or m.end() == pos: raise ValueError(f"bad molang near '{expr[pos:]}'")
+        tokens.append(m.group(1) and ('num', m.group(1)) or m.group(2) and ('name', m.group(2)) or ('op', m.group(3)))
+        pos = m.end()
+        while pos < len(expr) and expr[pos].isspace(): pos += 1
+
+    def peek(): return tokens[0] if tokens else ('end', None)
+    def take(op):
+        if peek() != ('op', op): raise ValueError(f"expected '{op}'")
+        tokens.pop(0)
+
+    def atom():
+        kind, val = tokens.pop(0) if tokens else ('end', None)
+        if kind == 'num': return repr(float(val))
+        if kind == 'op' and val == '(':
+            inner = parse(0); take(')')
+            return f"({inner})"
+        if kind == 'op' and val == '-': return f"(-{parse(8)})"
+        if kind == 'op' and val == '!': return f"float(not {parse(8)})"
+        if kind == 'name':
+            if peek() == ('op', '('):
+                if val not in MOLANG_FUNCS: raise ValueError(f"unknown function '{val}'")
+                tokens.pop(0)
+                args = []
+                while peek() != ('op', ')'):
+                    args.append(parse(0))
+                    if peek() == ('op', ','): tokens.pop(0)
+                take(')')
+                return f"_f[{val!r}]({', '.join(args)})"
+            if val in MOLANG_TIME: return "_t"
+            if val in MOLANG_CONSTS: return repr(MOLANG_CONSTS[val])
+            # Like blockbench, unset queries and variables read as 0
+            return "0.0"
+        raise ValueError(f"unexpected '{val}'" if val else "unexpected end")
+
+    def parse(min_prec):
+        left = atom()
+        while True:
+            kind, op = peek()
+            if kind == 'op' and op == '?' and min_prec <= 1:
+                tokens.pop(0)
+                a = parse(1); take(':'); b = parse(1)
+                left = f"(({a}) if ({left}) else ({b}))"
+            elif kind == 'op' and op in _BINARY and _BINARY[op] > min_prec:
+                tokens.pop(0)
+                right = parse(_BINARY[op])
+                if op == '/': left = f"_div({left}, {right})"
+                elif op == '&&': left = f"float(bool({left}) and bool({right}))"
+                elif op == '||': left = f"float(bool({left}) or bool({right}))"
+                elif op in ('+', '-', '*'): left = f"({left} {op} {right})"
+                else: left = f"float({left} {op} {right})"
+            else:
+                return left
+
+    src = parse(0)
+    if tokens: raise ValueError(f"unexpected '{tokens[0][1]}'")
+    return src
+
+@functools.lru_cache(maxsize=None)
+def compile_molang(expr):
+    try: fn = eval(f"lambda _t: {_molang_source(expr)}", {'__builtins__': {}, 'float': float, 'bool': bool, '_f': MOLANG_FUNCS, '_div': _div})
+    except (ValueError, SyntaxError) as e:
+        print(f"   ! molang '{expr}' not baked: {e}")
+        return None
+
+    def sample(t):
+        try: return float(fn(t))
+        except (ArithmeticError, ValueError, TypeError): return 0.0
+    return sample
+
+def is_molang(val):
+    return isinstance(val, str) and val.strip() != '' and safe_float(val, None) is None
+
+def molang_vec(dp, keys='xyz'):
+    fns = [compile_molang(dp.get(k)) if is_molang(dp.get(k)) else None for k in keys]
+    if not any(fns): return None
+    consts = get_vec(dp, keys)
+    return lambda t: [f(t) if f else c for f, c in zip(fns, consts)]
+
+def keyframe_vec(kf):
+    # A keyframe's value at its own time, molang axes are evaluated there
+    dp = kf['data_points'][0]
+    ev = molang_vec(dp)
+    return ev(safe_float(kf['time'])) if ev else get_vec(dp)
+
+def sample_span(start, end, eval_a, eval_b):
+    """Samples a keyframe span at tick resolution, times in ticks, evaluators take seconds"""
+    if end <= start: return [(start, eval_a(start / config.TICKS))]
+    ticks = [start + n for n in range(int(math.ceil(end - start)))] + [end]
+    length = (end - start) or 1
+    pts = []
+    for t in ticks:
+        a, b, alpha = eval_a(t / config.TICKS), eval_b(t / config.TICKS), (t - start) / length
+        pts.append((t, [x + (y - x) * alpha for x, y in zip(a, b)]))
+    return pts
+
+def bake_channel(keyframes, channel_name, end_time=None):
+    # Keyframes arrive time sorted from main.index_animation, end_time (ticks) bounds a trailing molang keyframe
     if not keyframes: return []
     
-    kfs = sorted(keyframes, key=lambda k: safe_float(k['time']))
+    kfs = keyframes
     count = len(kfs)
     segs = []
 
@@ -52,6 +190,24 @@ def bake_channel(keyframes, channel_name):
         mode = interp_map.get(cur.get('interpolation'), 1)
         if is_last: mode = 1
 
+        # Spans touching a molang keyframe are sampled every tick and left for simplify_segments to thin out
+        # A plain catmull keyframe keeps its curve and only needs the molang neighbour's value at its time
+        ev_cur, ev_nxt = molang_vec(dp_cur), molang_vec(dp_nxt)
+        if ev_cur or (ev_nxt and mode != 2):
+            const_cur, const_nxt = get_vec(dp_cur), p2
+            end = t_nxt if not is_last else max(t_cur, end_time or t_cur)
+            pts = sample_span(t_cur, end, ev_cur or (lambda t: const_cur), ev_nxt or (lambda t: const_nxt))
+            if channel_name == 'camera_scale':
+                pts = [(t, [1.0 if (sum(v) / 3.0) > 0.1 else 0.0] * 3) for t, v in pts]
+
+            for (ta, va), (tb, vb) in zip(pts, pts[1:]):
+                segs.append({'time': ta, 'duration': tb - ta, 'value': va, 'delta': [b-a for a, b in zip(va, vb)], 'interp': 1, 'sampled': True})
+            if is_last:
+                segs.append({'time': pts[-1][0], 'duration': 0, 'value': pts[-1][1], 'delta': [0, 0, 0], 'interp': 1, 'sampled': True})
+            continue
+
+        if ev_nxt: p2 = keyframe_vec(nxt)
+
         seg = {
             'time': t_cur, 'duration': max(0, t_nxt - t_cur),
             'value': p1, 'delta': [b-a for a, b in zip(p1, p2)],
@@ -59,12 +215,12 @@ def bake_channel(keyframes, channel_name):
         }
 
         if mode == 2: # Catmull
-            prev = kfs[i-1]['data_points'][0] if i > 0 else dp_cur
-            pp = kfs[i+2]['data_points'][0] if i < count - 2 else dp_nxt
+            prev = keyframe_vec(kfs[i-1] if i > 0 else cur)
+            pp = keyframe_vec(kfs[i+2] if i < count - 2 else nxt)
             
             seg['coeffs'] = []
             for j, ax in enumerate('xyz'):
-                c = catmull_coeff(safe_float(prev.get(ax)), p1[j], p2[j], safe_float(pp.get(ax)))
+                c = catmull_coeff(prev[j], p1[j], p2[j], pp[j])
                 seg['coeffs'].extend(c)
 
         elif mode == 3: # Bezier
@@ -83,10 +239,14 @@ def bake_channel(keyframes, channel_name):
 def simplify_segments(segs, threshold=0.002**2):
     if len(segs) < 3: return segs
 
+    # Sampled molang is a time series, so errors are measured against the chord at the same time
+    # and holds are kept instead of being merged as duplicates
+    timed = any(s.get('sampled') for s in segs)
+
     # Filter adjacent duplicates
     cleaned = [segs[0]]
     for s in segs[1:]:
-        if sq_dist(s['value'], cleaned[-1]['value']) > 1e-5:
+        if timed or sq_dist(s['value'], cleaned[-1]['value']) > 1e-5:
             cleaned.append(s)
     if cleaned[-1] is not segs[-1]: cleaned.append(segs[-1])
 
@@ -101,7 +261,10 @@ def simplify_segments(segs, threshold=0.002**2):
             if pts[i]['interp'] != 1: return pts # Don't simplify curves
             
             curr = pts[i]['value']
-            if denom == 0:
+            if timed:
+                t = (pts[i]['time'] - pts[0]['time']) / ((pts[-1]['time'] - pts[0]['time']) or 1)
+                d = sq_dist(curr, [s + t*(e-s) for s,e in zip(start, end)])
+            elif denom == 0:
                 d = sq_dist(curr, start)
             else:
                 t = max(0, min(1, sum((c-s)*(e-s) for c,s,e in zip(curr, start, end)) / denom))
@@ -128,7 +291,8 @@ def simplify_segments(segs, threshold=0.002**2):
             
     return simplified
 
-def serialize_stream(segments, duration):
+def serialize_stream(segments, duration, precision=None):
+    precision = precision or config.PRECISION
     segments.sort(key=lambda x: (x['tick'], x['pid'], x['cid']))
     chunks = []
     buf = bytearray(struct.pack('>hh', duration, len(segments)))
@@ -138,7 +302,7 @@ def serialize_stream(segments, duration):
     for item in segments:
         s = item['data']
         # Helper to convert float->fixed precision int
-        to_int = lambda v: [int(round(x * config.PRECISION)) for x in v]
+        to_int = lambda v: [int(round(x * precision)) for x in v]
         
         val_i = to_int(s['value'])
         delta_i = to_int(s['delta'])
@@ -194,4 +358,283 @@ def serialize_stream(segments, duration):
 
     if buf: 
         chunks.append(base64.b64encode(buf).decode('ascii'))
-    return chunks
\ No newline at end of file
+    return chunks
+
+# Column layout: every chunk groups its segments per channel and stores each field as its own run
+# (flags, time residuals, durations, delta-of-delta values, delta misses, curve data)
+
+def _pack_columns(items, precision):
+    by_ch = {}
+    for item in items: by_ch.setdefault((item['pid'], item['cid']), []).append(item['data'])
+
+    buf = bytearray()
+    write_varint(buf, len(by_ch))
+    for (pid, cid), segs in by_ch.items():
+        buf.append(((pid & 0x1F) << 3) | (cid & 0x07))
+        write_varint(buf, len(segs))
+
+    cols = list(by_ch.values())
+    to_int = lambda v: [int(round(x * precision)) for x in v]
+    vals = [[to_int(s['value']) for s in segs] for segs in cols]
+
+    # Deltas are predicted from the next value in the same channel, only misses are written
+    residuals = []
+    for segs, vs in zip(cols, vals):
+        for i, s in enumerate(segs):
+            nxt = vs[i+1] if i < len(segs) - 1 else vs[i]
+            residuals.append([d - (nxt[k] - vs[i][k]) for k, d in enumerate(to_int(s['delta']))])
+
+    # Flags: one nibble per segment, interp bits 0-1, bit 2 = delta predicted exactly
+    flags = [{2: 1, 3: 2}.get(s['interp'], 0) for segs in cols for s in segs]
+    flags = [f | (not any(r)) << 2 for f, r in zip(flags, residuals)]
+    for i in range(0, len(flags), 2):
+        buf.append(sum(f << (4 * j) for j, f in enumerate(flags[i:i+2])))
+
+    # Times are predicted from the previous segment's end
+    for segs in cols:
+        end = 0
+        for s in segs:
+            write_varint(buf, int(s['time']) - end)
+            end = int(s['time']) + int(s['duration'])
+    for segs in cols:
+        for s in segs: write_varint(buf, s['duration'])
+
+    for vs in vals:
+        for k in range(3):
+            prev, prev_d = 0, 0
+            for v in vs:
+                d = v[k] - prev
+                write_varint(buf, d - prev_d)
+                prev, prev_d = v[k], d
+    for r in residuals:
+        if any(r):
+            for x in r: write_varint(buf, x)
+
+    for segs, vs in zip(cols, vals):
+        for s, v in zip(segs, vs):
+            if s['interp'] == 2:
+                # The constant term of each axis is the start value, so only its residual is written
+                for j, c in enumerate(s.get('coeffs', [])):
+                    write_varint(buf, int(c * 100) - (int(v[j // 4] * 100 / precision) if j % 4 == 3 else 0))
+            elif s['interp'] == 3:
+                dur = s['duration'] or 1.0
+                for b in s.get('bezier', []):
+                    for t_handle in (b['lt'], b['rt']):
+                        norm = abs(t_handle * config.TICKS) / dur
+                        buf.append(int(max(0, min(255, norm * 255))))
+                    write_varint(buf, b['lv'] * 10000)
+                    write_varint(buf, b['rv'] * 10000)
+    return buf
+
+def serialize_stream_columnar(segments, duration, precision=None):
+    precision = precision or config.PRECISION
+    segments.sort(key=lambda x: (x['tick'], x['pid'], x['cid']))
+    chunks = []
+    header = struct.pack('>hh', duration, len(segments))
+    start = 0
+
+    while start < len(segments):
+        prefix = header if not chunks else b''
+        end = start + 1
+        while end < len(segments) and len(prefix) + len(_pack_columns(segments[start:end+1], precision)) <= config.CHUNK_SIZE:
+            end += 1
+        chunks.append(base64.b64encode(prefix + _pack_columns(segments[start:end], precision)).decode('ascii'))
+        start = end
+
+    if not chunks: chunks.append(base64.b64encode(header).decode('ascii'))
+    return chunks
+
+def deserialize_stream_columnar(chunks, precision=None):
+    precision = precision or config.PRECISION
+    items = []
+    duration = 0
+
+    for n, b64 in enumerate(chunks):
+        data = base64.b64decode(b64)
+        cursor = 0
+        if n == 0:
+            duration, _ = struct.unpack_from('>hh', data)
+            cursor = 4
+        if cursor >= len(data): continue
+
+        count, cursor = read_varint(data, cursor)
+        channels = []
+        for _ in range(count):
+            packed = data[cursor]; cursor += 1
+            seg_count, cursor = read_varint(data, cursor)
+            channels.append((packed >> 3, packed & 0x07, seg_count))
+
+        total = sum(c[2] for c in channels)
+        flag_bytes = data[cursor:cursor + (total + 1) // 2]
+        cursor += len(flag_bytes)
+        flags = [(flag_bytes[i // 2] >> (4 * (i % 2))) & 0x0F for i in range(total)]
+
+        residuals, durs, times = [], [], []
+        for col in (residuals, durs):
+            for _, _, seg_count in channels:
+                run = []
+                for _ in range(seg_count):
+                    v, cursor = read_varint(data, cursor)
+                    run.append(v)
+                col.append(run)
+        for res, dur in zip(residuals, durs):
+            end, run = 0, []
+            for r, d in zip(res, dur):
+                run.append(end + r)
+                end = run[-1] + d
+            times.append(run)
+
+        vals, deltas = [], []
+        for _, _, seg_count in channels:
+            col = [[0, 0, 0] for _ in range(seg_count)]
+            for k in range(3):
+                prev, prev_d = 0, 0
+                for v in col:
+                    dd, cursor = read_varint(data, cursor)
+                    prev_d += dd
+                    prev += prev_d
+                    v[k] = prev
+            vals.append(col)
+        idx = 0
+        for col in vals:
+            dcol = []
+            for i, v in enumerate(col):
+                nxt = col[i+1] if i < len(col) - 1 else v
+                r = [0, 0, 0]
+                if not flags[idx] & 0x04:
+                    for k in range(3): r[k], cursor = read_varint(data, cursor)
+                dcol.append([r[k] + nxt[k] - v[k] for k in range(3)])
+                idx += 1
+            deltas.append(dcol)
+
+        idx = 0
+        for i, (pid, cid, seg_count) in enumerate(channels):
+            for j in range(seg_count):
+                s = {
+                    'time': times[i][j], 'duration': durs[i][j],
+                    'value': [v / precision for v in vals[i][j]],
+                    'delta': [d / precision for d in deltas[i][j]],
+                    'interp': {1: 2, 2: 3}.get(flags[idx] & 0x03, 1)
+                }
+                idx += 1
+                if s['interp'] == 2:
+                    s['coeffs'] = []
+                    for k in range(12):
+                        c, cursor = read_varint(data, cursor)
+                        if k % 4 == 3: c += int(vals[i][j][k // 4] * 100 / precision)
+                        s['coeffs'].append(c / 100.0)
+                elif s['interp'] == 3:
+                    s['bezier'] = []
+                    for _ in range(3):
+                        lt, rt = data[cursor], data[cursor+1]; cursor += 2
+                        lv, cursor = read_varint(data, cursor)
+                        rv, cursor = read_varint(data, cursor)
+                        s['bezier'].append({'lt': lt / 255.0, 'rt': rt / 255.0, 'lv': lv / 10000.0, 'rv': rv / 10000.0})
+                items.append({'tick': s['time'], 'pid': pid, 'cid': cid, 'data': s})
+
+    items.sort(key=lambda x: (x['tick'], x['pid'], x['cid']))
+    return duration, items
+
+# Pose tables: every channel sampled each `stride` ticks, one record per channel run in a chunk
+# (packed pid/cid byte, start sample, sample count, then per sample the xyz change from the previous one)
+
+def segment_value(seg, t):
+    # Same maths as player.lua _solveMath, t being the 0-1 progress through the segment
+    s, d = seg['value'], seg['delta']
+    if seg['interp'] == 2:
+        c = seg['coeffs']
+        return [((c[4*j] * t + c[4*j+1]) * t + c[4*j+2]) * t + c[4*j+3] for j in range(3)]
+    if seg['interp'] == 3:
+        out = []
+        for j, b in enumerate(seg['bezier']):
+            p0, p1, p2, p3 = s[j], s[j] + b['rv'], s[j] + d[j] + b['lv'], s[j] + d[j]
+            u = 1 - t
+            out.append(u*u*u*p0 + 3*u*u*t*p1 + 3*u*t*t*p2 + t*t*t*p3)
+        return out
+    return [a + b * t for a, b in zip(s, d)]
+
+def channel_value(segs, time):
+    # Same lookup as player.lua _processChannel, segment times as the client reads them
+    seg = next((s for s in reversed(segs) if time >= int(s['time'])), segs[0])
+    start, dur = int(seg['time']), int(seg['duration'])
+    if time >= start + dur: return [a + b for a, b in zip(seg['value'], seg['delta'])]
+    return segment_value(seg, min(1, max(0, (time - start) / dur)))
+
+def by_channel(items):
+    out = {}
+    for item in sorted(items, key=lambda x: (x['tick'], x['pid'], x['cid'])):
+        out.setdefault((item['pid'], item['cid']), []).append(item['data'])
+    return out
+
+def refine_items(coarser, fine, duration, thresholds):
+    """The channels of `fine` that any coarser tier, as a client decodes it, strays too far from.
+    `coarser` lists (precision, items) per tier: whichever one a client started on or last refined
+    a channel with is the version it holds, so a channel is only left out if all of them are close"""
+    keep, seen = set(), set()
+    for precision, coarse in coarser:
+        q = lambda v: [round(x * precision) / precision for x in v]
+        old = {key: [dict(s, value=q(s['value']), delta=q(s['delta'])) for s in segs] for key, segs in by_channel(coarse).items()}
+        for key, segs in by_channel(fine).items():
+            # A tier without the channel can't be what a client holds, the refinement that first adds it is
+            if key in keep or key not in old: continue
+            seen.add(key)
+            for t in range(int(duration) + 1):
+                if sq_dist(channel_value(old[key], t), channel_value(segs, t)) > thresholds[key[1]]:
+                    keep.add(key); break
+    return [item for item in fine if (item['pid'], item['cid']) in keep or (item['pid'], item['cid']) not in seen]
+
+def sample_poses(segments, duration, stride):
+    count = -(-duration // stride) + 1
+    return {key: [channel_value(segs, min(k * stride, duration)) for k in range(count)] for key, segs in by_channel(segments).items()}
+
+def pose_error(segments, table, duration, stride, precision=None):
+    """Largest gap per channel type between the segments and the decoded pose table, checked every tick"""
+    precision = precision or config.PRECISION
+    worst = {}
+    for key, segs in by_channel(segments).items():
+        poses = [[round(x * precision) / precision for x in p] for p in table[key]]
+        name = ['position', 'rotation', 'scale'][key[1] - 1]
+        for t in range(int(duration) + 1):
+            # player.lua _processPoses: blend the samples around t, holding the last one
+            i, u = t // stride, (t % stride) / stride
+            a, b = poses[min(i, len(poses) - 1)], poses[min(i + 1, len(poses) - 1)]
+            got = [x + (y - x) * u for x, y in zip(a, b)]
+            gap = max(abs(x - y) for x, y in zip(got, channel_value(segs, t)))
+            worst[name] = max(worst.get(name, 0.0), gap)
+    return worst
+
+def serialize_pose_table(table, duration, precision=None):
+    precision = precision or config.PRECISION
+    chunks = []
+    # The reader skips the count, it is only clamped to fit long tables into the row layout's header
+    buf = bytearray(struct.pack('>hh', duration, min(sum(len(p) for p in table.values()), 0x7FFF)))
+
+    for (pid, cid), poses in sorted(table.items()):
+        q = [[int(round(x * precision)) for x in p] for p in poses]
+        # The client holds the last sample, so a trailing hold costs nothing
+        while len(q) > 1 and q[-1] == q[-2]: q.pop()
+
+        k = 0
+        while k < len(q):
+            body, prev, n = bytearray(), [0, 0, 0], 0
+            while k + n < len(q):
+                sample = bytearray()
+                for a, b in zip(q[k + n], prev): write_varint(sample, a - b)
+                # 7 bytes covers the packed id and the start/count varints, an empty chunk always takes one sample
+                if (buf or n) and len(buf) + 7 + len(body) + len(sample) > config.CHUNK_SIZE: break
+                body += sample; prev = q[k + n]; n += 1
+
+            if not n:
+                chunks.append(base64.b64encode(buf).decode('ascii'))
+                buf = bytearray()
+                continue
+
+            buf.append(((pid & 0x1F) << 3) | (cid & 0x07))
+            write_varint(buf, k)
+            write_varint(buf, n)
+            buf.extend(body)
+            k += n
+
+    if buf:
+        chunks.append(base64.b64encode(buf).decode('ascii'))
+    return chunks
@@ -3,6 +3,37 @@ TICKS = 20
 CHUNK_SIZE = 100 
 PRECISION = 1000
 
+# Optional LOD tiers, coarsest first. Each one is baked as an extra self contained stream next to the
+# full one, using its own precision (PRECISION if left out), simplify thresholds (rotation in degrees,
+# position/scale in units) and optionally only some parts. A client starts on the tier it picks, then
+# streams refinements (the channels each finer tier changes) up to the full animation while it plays.
+# Sizes are in the manifest.
+TIERS = []
+# TIERS = [
+#     {'name': 'base', 'precision': 10, 'rotation': 3.0, 'position': 0.1, 'parts': ['root', 'body', 'head']},
+#     {'name': 'mid', 'precision': 100, 'rotation': 0.75, 'position': 0.02},
+# ]
+
+# Client cost estimate, in rough Lua instructions. CLIENT_BYTES_PER_SECOND should match MAX_BYTES_PER_SECOND
+# in the Lua config and COST_LIMITS the instruction limits your viewers have (ping = one received ping,
+# tick = one render of player.lua). With CAP_COST on, curves at the worst tick get demoted and linear runs
+# simplified harder while that lowers the peaks; a ping that stays over asks for a lower byte rate.
+CLIENT_BYTES_PER_SECOND = 800
+COST_LIMITS = {'ping': 20000, 'tick': 4000}
+CAP_COST = False
+COST_WEIGHTS = {
+    'segment': 60, 'varint_byte': 10, 'context': 8, 'decode': {1: 0, 2: 15, 3: 45},
+    'channel': 20, 'scan': 4, 'hold': 15, 'eval': {1: 25, 2: 40, 3: 80},
+    'sample': 35, 'pose': 30
+}
+
+# Pose tables: with a stride above 0 every animation is also sampled every POSE_STRIDE ticks, and the
+# table is sent instead of the segments when it is smaller, or cheaper to play and at most POSE_MAX_GROWTH
+# times the size. It is never picked if it costs more to decode per ping (or goes over COST_LIMITS when
+# capping). The largest gap from the segments is recorded next to the choice
+POSE_STRIDE = 0
+POSE_MAX_GROWTH = 1.5
+
 # File Paths
 MODEL_PATH = "model.bbmodel"
 OUT_DIR = "animations/"
@@ -20,4 +51,11 @@ CAMERAS = {'shared': 'sharedCamera', 'player1': 'P1Camera', 'player2': 'P2Camera
 # Helper to get global IDs
 def get_part_ids():
     parts = sorted({p for role in PART_MAP.values() for p in role.keys()})
-    return {p: i + 1 for i, p in enumerate(parts)}
\ No newline at end of file
+    return {p: i + 1 for i, p in enumerate(parts)}
+
+# Reverse lookup of blockbench bone name -> (role, internal part)
+def get_bone_index():
+    index = {}
+    for role, parts in PART_MAP.items():
+        for internal, bb in parts.items(): index.setdefault(bb, (role, internal))
+    return index
\ No newline at end of file
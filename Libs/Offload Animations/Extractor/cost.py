@@ -0,0 +1,204 @@
+import base64, math, copy
+import config, compiler
+
+# Estimates the Lua side work for a baked stream, mirroring stream.lua (decode per ping)
+# and player.lua (evaluation per tick), in rough instruction counts from config.COST_WEIGHTS
+
+def parse_chunk(data, skip_header=False):
+    # Walks a row layout chunk the way read_segment does, noting what each segment cost to read
+    cursor = 4 if skip_header else 0
+    ctx = {'pid': -1, 'cid': -1, 'time': 0}
+    segs = []
+
+    while cursor < len(data):
+        flag = data[cursor]; cursor += 1
+        interp = {1: 2, 2: 3}.get((flag >> 3) & 0x03, 1)
+
+        if flag & 0x01:
+            packed = data[cursor]; cursor += 1
+            ctx.update({'pid': packed >> 3, 'cid': packed & 0x07, 'time': 0})
+
+        start = cursor
+        dt, cursor = compiler.read_varint(data, cursor)
+        ctx['time'] += dt
+        varints = 1 + (0 if flag & 0x02 else 3) + (0 if flag & 0x04 else 3) + (12 if interp == 2 else 0)
+        for _ in range(varints): _, cursor = compiler.read_varint(data, cursor)
+        n = cursor - start
+
+        if interp == 3:
+            for _ in range(3):
+                cursor += 2
+                mark = cursor
+                for _ in range(2): _, cursor = compiler.read_varint(data, cursor)
+                n += cursor - mark
+
+        segs.append({'pid': ctx['pid'], 'cid': ctx['cid'], 'time': ctx['time'], 'interp': interp, 'varint_bytes': n, 'new_ctx': bool(flag & 0x01)})
+    return segs
+
+def parse_pose_chunk(data, skip_header=False):
+    # Pose records as read by stream.lua read_pose_record, one entry per sample
+    cursor = 4 if skip_header else 0
+    samples = []
+
+    while cursor < len(data):
+        packed = data[cursor]; cursor += 1
+        start, cursor = compiler.read_varint(data, cursor)
+        count, cursor = compiler.read_varint(data, cursor)
+        for k in range(count):
+            mark = cursor
+            for _ in range(3): _, cursor = compiler.read_varint(data, cursor)
+            samples.append({'pid': packed >> 3, 'cid': packed & 0x07, 'index': start + k, 'varint_bytes': cursor - mark, 'new_ctx': k == 0})
+    return samples
+
+def _segment_work(s):
+    w = config.COST_WEIGHTS
+    return w['segment'] + w['varint_byte'] * s['varint_bytes'] + (w['context'] if s['new_ctx'] else 0) + w['decode'][s['interp']]
+
+def _sample_work(s):
+    w = config.COST_WEIGHTS
+    return w['sample'] + w['varint_byte'] * s['varint_bytes'] + (w['context'] if s['new_ctx'] else 0)
+
+def decode_costs(chunks, parse=parse_chunk, work=_segment_work):
+    raw = [base64.b64decode(c) for c in chunks]
+    allowed = min(config.CLIENT_BYTES_PER_SECOND, 1024)
+
+    # StreamManager.update packs whole chunks into one ping until the byte allowance is used up
+    pings, size = [], 0
+    for i, data in enumerate(raw):
+        if not pings or (size > 0 and size + len(data) > allowed):
+            pings.append([]); size = 0
+        pings[-1].append(i)
+        size += len(data)
+
+    out = []
+    for ping in pings:
+        segs = [s for i in ping for s in parse(raw[i], skip_header=(i == 0))]
+        out.append({'chunks': ping, 'segments': segs, 'bytes': sum(len(raw[i]) for i in ping), 'cost': sum(work(s) for s in segs)})
+    return out
+
+def eval_costs(items, dur):
+    w = config.COST_WEIGHTS
+    channels = {}
+    for item in sorted(items, key=lambda x: (x['tick'], x['pid'], x['cid'])):
+        channels.setdefault((item['pid'], item['cid']), []).append(item['data'])
+
+    # _processChannel: reverse scan for the active segment, then solve it or hold the final value
+    costs = []
+    for tick in range(int(dur) + 1):
+        work = 0
+        for segs in channels.values():
+            n = len(segs)
+            if tick >= int(segs[-1]['time']): idx, scanned = n - 1, 0
+            else:
+                idx = next((i for i in range(n - 1, -1, -1) if tick >= int(segs[i]['time'])), 0)
+                scanned = n - idx
+            seg = segs[idx]
+            work += w['channel'] + w['scan'] * scanned
+            work += w['hold'] if tick >= int(seg['time']) + int(seg['duration']) else w['eval'][seg['interp']]
+        costs.append(work)
+    return costs, len(channels)
+
+def _report(pings, ticks, channels):
+    peak_ping = max(range(len(pings)), key=lambda i: pings[i]['cost']) if pings else 0
+    peak_tick = max(range(len(ticks)), key=lambda i: ticks[i]) if ticks else 0
+    return {
+        'varintBytes': sum(s['varint_bytes'] for p in pings for s in p['segments']),
+        'channels': channels,
+        'pings': len(pings),
+        'peakPing': {'index': peak_ping, 'cost': pings[peak_ping]['cost'] if pings else 0, 'bytes': pings[peak_ping]['bytes'] if pings else 0},
+        'peakTick': {'tick': peak_tick, 'cost': ticks[peak_tick] if ticks else 0}
+    }
+
+def estimate(items, chunks, dur):
+    pings = decode_costs(chunks)
+    ticks, channels = eval_costs(items, dur)
+    interps = [s['interp'] for p in pings for s in p['segments']]
+    report = _report(pings, ticks, channels)
+    report['segments'] = {'linear': interps.count(1), 'catmull': interps.count(2), 'bezier': interps.count(3)}
+    return report
+
+def estimate_poses(table, chunks, dur):
+    # A pose channel is one index and one lerp per tick, whatever the animation looked like
+    w = config.COST_WEIGHTS
+    pings = decode_costs(chunks, parse_pose_chunk, _sample_work)
+    ticks = [len(table) * (w['channel'] + w['pose'])] * (int(dur) + 1)
+    report = _report(pings, ticks, len(table))
+    report['samples'] = sum(len(p['segments']) for p in pings)
+    return report
+
+def demote(seg, threshold):
+    """Replaces a curve segment with linear segments sampled every tick, thinned by simplify_segments"""
+    dur = seg['duration']
+    n = max(1, int(math.ceil(dur)))
+    pts = [(seg['time'] + dur * k / n, compiler.segment_value(seg, k / n)) for k in range(n + 1)]
+    segs = [{'time': ta, 'duration': tb - ta, 'value': va, 'delta': [b-a for a, b in zip(va, vb)], 'interp': 1, 'sampled': True}
+            for (ta, va), (tb, vb) in zip(pts, pts[1:])]
+    segs.append({'time': pts[-1][0], 'duration': 0, 'value': pts[-1][1], 'delta': [0, 0, 0], 'interp': 1, 'sampled': True})
+
+    # The end point is already covered by holding the last segment's final value
+    segs = compiler.simplify_segments(segs, threshold)[:-1]
+    segs[-1]['duration'] = seg['time'] + dur - segs[-1]['time']
+    return segs
+
+def _score(report):
+    limits = config.COST_LIMITS
+    return max(report['peakPing']['cost'] / limits['ping'], report['peakTick']['cost'] / limits['tick'])
+
+def _resimplify(items, dur, thresholds, factor):
+    chans = {}
+    for item in items: chans.setdefault((item['pid'], item['cid']), []).append(item)
+
+    out = []
+    for (pid, cid), group in chans.items():
+        last = group[-1]['data']
+        segs = compiler.simplify_segments([copy.deepcopy(x['data']) for x in group], thresholds[cid] * factor)
+        if len(segs) < len(group): segs[-1]['duration'] = max(0, last['time'] + last['duration'] - segs[-1]['time'])
+        else: segs = [x['data'] for x in group]
+        out.extend(dict(group[0], data=s) for s in segs)
+    return out
+
+def _steps(items, dur, report, thresholds):
+    # Cheapest change first: single curves live at the peak tick, then coarser linear runs everywhere
+    t = report['peakTick']['tick']
+    for i, item in enumerate(items):
+        s = item['data']
+        if s['interp'] != 1 and int(s['time']) <= t < int(s['time']) + int(s['duration']):
+            yield items[:i] + [dict(item, data=x) for x in demote(copy.deepcopy(s), thresholds[item['cid']])] + items[i+1:]
+    for factor in (2, 4, 8):
+        yield _resimplify(items, dur, thresholds, factor)
+
+def cap(items, dur, serialize, thresholds):
+    """Applies demotions / coarser simplification while they lower the worst of the ping and tick peaks"""
+    limits = config.COST_LIMITS
+    chunks = serialize(items, dur)
+    report = estimate(items, chunks, dur)
+    changed = 0
+
+    while report['peakTick']['cost'] > limits['tick'] or report['peakPing']['cost'] > limits['ping']:
+        for trial in _steps(items, dur, report, thresholds):
+            trial_chunks = serialize(trial, dur)
+            trial_report = estimate(trial, trial_chunks, dur)
+            if _score(trial_report) < _score(report):
+                items[:], chunks, report = trial, trial_chunks, trial_report
+                changed += 1
+                break
+        else:
+            break
+
+    # A ping holds as many bytes as the client allows, so past this point only a lower rate helps
+    if report['peakPing']['cost'] > limits['ping']:
+        per_byte = report['peakPing']['cost'] / max(1, report['peakPing']['bytes'])
+        report['suggestedBytesPerSecond'] = int(limits['ping'] / per_byte)
+    report['changes'] = changed
+    return chunks, report
+
+def summary(report):
+    limits = config.COST_LIMITS
+    segs = report.get('segments')
+    shape = f"segments {segs['linear']}L {segs['catmull']}C {segs['bezier']}B" if segs else f"{report['samples']} pose samples"
+    return (f"ping peak {report['peakPing']['cost']}/{limits['ping']} ({report['pings']} pings), "
+            f"tick peak {report['peakTick']['cost']}/{limits['tick']} @ {report['peakTick']['tick']}, "
+            f"{shape}, "
+            f"{report['varintBytes']} varint bytes, {report['channels']} channels"
+            + (f", {report['changes']} cost fixes" if report.get('changes') else "")
+            + (f", lower bytes/s to {report['suggestedBytesPerSecond']}" if 'suggestedBytesPerSecond' in report else ""))
@@ -1,14 +1,108 @@
-import os, json, hashlib
-import config, compiler
+import os, sys, json, hashlib, zlib, base64, shutil, asyncio
+import config, compiler, cost
 
-def run():
-    print("Baking...")
-    os.makedirs(config.OUT_DIR, exist_ok=True)
+def index_animation(anim):
+    # One pass over the raw animation, every later stage reads from this instead of the keyframe lists
+    raw = json.dumps(anim, sort_keys=True, separators=(',', ':'))
+    bones = {}
+    max_time = 0
+    events = []
+    
+    for anim_node in anim.get('animators', {}).values():
+        if anim_node.get('type') == 'effect':
+            for k in anim_node['keyframes']:
+                if k.get('channel') == 'timeline':
+                    dp = k.get('data_points', [{}])[0]
+                    events.append({'time': compiler.safe_float(k['time']), 'script': dp.get('script', '')})
+            continue
+
+        channels = {}
+        active = False
+        for k in anim_node['keyframes']:
+            t = compiler.safe_float(k['time'])
+            max_time = max(max_time, t)
+            channels.setdefault(k['channel'], []).append((t, k))
+
+            if k['channel'] == 'scale' and not active:
+                active = sum(compiler.get_vec(k['data_points'][0])) / 3.0 > 0.1
+
+        bones[anim_node['name']] = {
+            'channels': {ch: [k for _, k in sorted(kfs, key=lambda x: x[0])] for ch, kfs in channels.items()},
+            'active': active
+        }
     
+    return {
+        'name': anim['name'],
+        'hash': hashlib.sha256(raw.encode()).hexdigest(),
+        'max_time': max_time,
+        'events': events,
+        'bones': bones
+    }
+
+def channel_thresholds(tier=None):
+    tier = tier or {}
+    rot, pos = tier.get('rotation', 0.1), tier.get('position', 0.002)
+    return {1: pos**2, 2: rot**2, 3: pos**2}
+
+def bake_streams(ir, dur, part_ids, bone_index, tier=None):
+    tier = tier or {}
+    thresholds = channel_thresholds(tier)
+    streams = {}
+    used = set()
+    for bb_name, bone in ir['bones'].items():
+        role, internal = bone_index.get(bb_name, (None, None))
+        if not role: continue
+        if 'parts' in tier and internal not in tier['parts']: continue
+        
+        used.add(internal)
+        current_pid = part_ids[internal]
+        channels = bone['channels']
+
+        for ch_name in ['position', 'rotation', 'scale']:
+            if ch_name not in channels: continue
+            
+            segs = compiler.bake_channel(channels[ch_name], ch_name, dur)
+            segs = compiler.simplify_segments(segs, threshold=thresholds[['position', 'rotation', 'scale'].index(ch_name) + 1])
+            
+            if segs and (segs[-1]['time'] + segs[-1]['duration'] < dur):
+                segs[-1]['duration'] = dur - segs[-1]['time']
+
+            streams.setdefault(role, []).extend({
+                'tick': segs[0]['time'], 
+                'pid': current_pid,
+                'cid': ['position', 'rotation', 'scale'].index(ch_name) + 1,
+                'data': s
+            } for s in segs)
+    return streams, used
+
+def compare_layouts():
+    # The Lua receiver only decodes the row layout, the columnar one is only baked here to compare sizes
     with open(config.MODEL_PATH, 'r', encoding='utf-8') as f:
         model = json.load(f)
 
     part_ids = config.get_part_ids()
+    bone_index = config.get_bone_index()
+    totals = {'row': [0, 0], 'columnar': [0, 0]}
+    print(f"{'animation':<24}{'row':>8}{'row+z':>8}{'col':>8}{'col+z':>8}")
+
+    for anim in model.get('animations', []):
+        ir = index_animation(anim)
+        dur = int(ir['max_time'] * config.TICKS)
+        streams, _ = bake_streams(ir, dur, part_ids, bone_index)
+        sizes = []
+        for layout, serialize in (('row', compiler.serialize_stream), ('columnar', compiler.serialize_stream_columnar)):
+            raw = b''.join(base64.b64decode(c) for items in streams.values() for c in serialize(items, dur))
+            packed = len(zlib.compress(raw, 9))
+            totals[layout][0] += len(raw); totals[layout][1] += packed
+            sizes += [len(raw), packed]
+        print(f"{anim['name']:<24}" + ''.join(f"{x:>8}" for x in sizes))
+
+    print(f"{'total':<24}" + ''.join(f"{x:>8}" for x in totals['row'] + totals['columnar']))
+
+async def bake(animations, out_dir=None):
+    out_dir = out_dir or config.OUT_DIR
+    part_ids = config.get_part_ids()
+    bone_index = config.get_bone_index()
 
     manifest = {
         'anims': {}, 
@@ -17,143 +111,204 @@ def run():
     }
     
     part_usage = {k: set() for k in part_ids}
+    progress = {'anim': None, 'stream': None, 'animations': 0, 'total': len(animations), 'segments': 0, 'bytes': 0, 'cost': {}, 'encoding': None}
 
-    for anim in model.get('animations', []):
-        name = anim['name']
-        print(f"-> {name}")
-        
-        raw = json.dumps(anim, sort_keys=True, separators=(',', ':'))
-        ahash = hashlib.sha256(raw.encode()).hexdigest()
-        manifest['anims'][name] = ahash
-        
-        raw_parts = {}
-        max_time = 0
-        events = []
+    # Files are written to a staging folder and only moved into place once every animation is done,
+    # so a cancelled bake never leaves a half written output directory behind
+    staging = out_dir.rstrip('/\\') + '.partial'
+    if os.path.exists(staging): shutil.rmtree(staging)
+    os.makedirs(staging)
+
+    try:
+        for anim in animations:
+            ir = index_animation(anim)
+            name, ahash = ir['name'], ir['hash']
+            manifest['anims'][name] = ahash
         
-        for anim_node in anim.get('animators', {}).values():
-            if anim_node.get('type') == 'effect':
-                for k in anim_node['keyframes']:
-                    if k.get('channel') == 'timeline':
-                        dp = k.get('data_points', [{}])[0]
-                        t_val = compiler.safe_float(k['time'])
-                        events.append({'tick': int(t_val*config.TICKS), 'script': dp.get('script', '')})
+            bones = ir['bones']
+            dur = int(ir['max_time'] * config.TICKS)
+            events = [{'tick': int(e['time']*config.TICKS), 'script': e['script']} for e in ir['events']]
+
+            check_active = lambda bone_name: bones.get(bone_name, {}).get('active', False)
+            settings_out = {s_key: check_active(s_key) for s_key in config.SETTINGS}
+
+            settings_out['cameras'] = {}
+            if settings_out.get('useCamera'):
+                for key, bone in config.CAMERAS.items():
+                    settings_out['cameras'][key] = check_active(bone)
             else:
-                raw_parts[anim_node['name']] = anim_node['keyframes']
-                for k in anim_node['keyframes']:
-                    max_time = max(max_time, compiler.safe_float(k['time']))
-        
-        dur = int(max_time * config.TICKS)
-
-        settings_out = {}
-        def check_active(bone_name):
-            kfs = raw_parts.get(bone_name, [])
-            for k in kfs:
-                if k.get('channel') == 'scale':
-                    dp = k['data_points'][0]
-                    val = (compiler.safe_float(dp.get('x',0)) + 
-                           compiler.safe_float(dp.get('y',0)) + 
-                           compiler.safe_float(dp.get('z',0))) / 3.0
-                    if val > 0.1: return True
-            return False
-
-        for s_key in config.SETTINGS:
-            settings_out[s_key] = check_active(s_key)
-
-        settings_out['cameras'] = {}
-        if settings_out.get('useCamera'):
-            for key, bone in config.CAMERAS.items():
-                settings_out['cameras'][key] = check_active(bone)
-        else:
-            for key in config.CAMERAS:
-                settings_out['cameras'][key] = False
-
-        streams = {}
-        for bb_name, kfs_list in raw_parts.items():
-            role, internal = next(((r, i) for r, map in config.PART_MAP.items() for i, bb in map.items() if bb == bb_name), (None, None))
-            if not role: continue
-            
-            part_usage[internal].add(name)
-            current_pid = part_ids[internal]
-            
-            channels = {}
-            for k in kfs_list: channels.setdefault(k['channel'], []).append(k)
+                for key in config.CAMERAS:
+                    settings_out['cameras'][key] = False
 
-            for ch_name in ['position', 'rotation', 'scale']:
-                if ch_name not in channels: continue
-                
-                segs = compiler.bake_channel(channels[ch_name], ch_name)
-                segs = compiler.simplify_segments(segs, threshold=0.1**2 if ch_name=='rotation' else 0.002**2)
-                
-                if segs and (segs[-1]['time'] + segs[-1]['duration'] < dur):
-                    segs[-1]['duration'] = dur - segs[-1]['time']
+            streams, used = bake_streams(ir, dur, part_ids, bone_index)
+            for internal in used: part_usage[internal].add(name)
 
-                if role not in streams: streams[role] = []
-                
-                streams[role].append([{
-                    'tick': segs[0]['time'], 
-                    'pid': current_pid,
-                    'cid': ['position', 'rotation', 'scale'].index(ch_name) + 1,
-                    'data': s
-                } for s in segs])
-
-        final_streams = {r: compiler.serialize_stream([x for sub in s for x in sub], dur) for r, s in streams.items()}
-
-        cams = {}
-        if settings_out.get('useCamera'):
-            for key, bone in config.CAMERAS.items():
-                if not settings_out['cameras'].get(key): continue
+            # cost.cap swaps the items in place, poses have a fixed tick cost so they're sampled from the uncapped ones
+            uncapped = {r: list(items) for r, items in streams.items()}
+            serialize = compiler.serialize_stream
+            final_streams = {}
+            costs = {}
+            for r, items in streams.items():
+                if config.CAP_COST: final_streams[r], costs[r] = cost.cap(items, dur, serialize, channel_thresholds())
+                else:
+                    final_streams[r] = serialize(items, dur)
+                    costs[r] = cost.estimate(items, final_streams[r], dur)
+                progress.update(anim=name, stream=r)
+                progress['segments'] += len(items)
+                progress['bytes'] += sum(len(base64.b64decode(c)) for c in final_streams[r])
+                await asyncio.sleep(0)
+                yield dict(progress)
+
+            # Short or dense animations can be cheaper to send as sampled poses than as segments
+            encoding, use_poses = None, False
+            if config.POSE_STRIDE > 0:
+                pose_streams, pose_costs, pose_error = {}, {}, {}
+                for r, items in uncapped.items():
+                    table = compiler.sample_poses(items, dur, config.POSE_STRIDE)
+                    pose_streams[r] = compiler.serialize_pose_table(table, dur)
+                    pose_costs[r] = cost.estimate_poses(table, pose_streams[r], dur)
+                    for ch, gap in compiler.pose_error(items, table, dur, config.POSE_STRIDE).items():
+                        pose_error[ch] = round(max(pose_error.get(ch, 0.0), gap), 4)
+
+                totals = lambda chunks, costs: {
+                    'bytes': sum(len(base64.b64decode(c)) for v in chunks.values() for c in v),
+                    'pingCost': max((c['peakPing']['cost'] for c in costs.values()), default=0),
+                    'tickCost': max((c['peakTick']['cost'] for c in costs.values()), default=0)
+                }
+                seg_total, pose_total = totals(final_streams, costs), totals(pose_streams, pose_costs)
+                pose_total['maxError'] = pose_error
+                # Poses have to be no harder to decode than the segments, and when capping stay under the ping limit
+                decodes = pose_total['pingCost'] <= seg_total['pingCost'] and (
+                    not config.CAP_COST or pose_total['pingCost'] <= config.COST_LIMITS['ping'])
+                use_poses = decodes and (pose_total['bytes'] <= seg_total['bytes'] or (
+                    pose_total['tickCost'] < seg_total['tickCost'] and pose_total['bytes'] <= seg_total['bytes'] * config.POSE_MAX_GROWTH))
+
+                encoding = {'mode': 'poses' if use_poses else 'segments', 'stride': config.POSE_STRIDE, 'segments': seg_total, 'poses': pose_total}
+                if use_poses: final_streams, costs = pose_streams, pose_costs
+
+            # Coarser self contained copies of the streams, so clients can start on a cheap tier first. Every
+            # finer tier (and the full stream) also gets a refinement: only the channels that moved past its
+            # thresholds against every coarser tier, which a client already playing one of those swaps in
+            tiers_out = {}
+            coarser = []
+            for tier in config.TIERS:
+                # Like the thresholds, a tier without its own precision uses the full one
+                precision = tier.get('precision', config.PRECISION)
+                tier_streams, _ = bake_streams(ir, dur, part_ids, bone_index, tier)
+                entry = tiers_out[tier['name']] = {'precision': precision, 'streams': {}}
+                if coarser: entry['refine'] = {}
+                for r, items in tier_streams.items():
+                    entry['streams'][r] = serialize(items, dur, precision)
+                    if coarser:
+                        changed = compiler.refine_items([(p, c.get(r, [])) for p, c in coarser], items, dur, channel_thresholds(tier))
+                        if changed: entry['refine'][r] = serialize(changed, dur, precision)
+                    progress.update(anim=name, stream=f"{r}:{tier['name']}")
+                    await asyncio.sleep(0)
+                    yield dict(progress)
+                coarser.append((precision, tier_streams))
+
+            refine_out = {}
+            for r, items in ((uncapped if use_poses else streams).items() if coarser else ()):
+                changed = compiler.refine_items([(p, c.get(r, [])) for p, c in coarser], items, dur, channel_thresholds())
+                if not changed: continue
+                if use_poses:
+                    refine_out[r] = compiler.serialize_pose_table(compiler.sample_poses(changed, dur, config.POSE_STRIDE), dur)
+                else:
+                    refine_out[r] = serialize(changed, dur)
+
+            cams = {}
+            if settings_out.get('useCamera'):
+                for key, bone in config.CAMERAS.items():
+                    if not settings_out['cameras'].get(key): continue
                 
-                kfs = raw_parts.get(bone, [])
-                if not kfs: continue
+                    by_ch = bones.get(bone, {}).get('channels')
+                    if not by_ch: continue
                 
-                cam_role = {}
-                by_ch = {}
-                for k in kfs: by_ch.setdefault(k['channel'], []).append(k)
+                    cam_role = {}
                 
-                for ch in ['position', 'rotation', 'scale']:
-                    if ch not in by_ch: continue
+                    for ch in ['position', 'rotation', 'scale']:
+                        if ch not in by_ch: continue
                     
-                    mode_name = "camera_scale" if ch == "scale" else ch
-                    bk = compiler.bake_channel(by_ch[ch], mode_name) 
-                    bk = compiler.simplify_segments(bk)
+                        mode_name = "camera_scale" if ch == "scale" else ch
+                        bk = compiler.bake_channel(by_ch[ch], mode_name, dur) 
+                        bk = compiler.simplify_segments(bk)
                     
-                    if bk and (bk[-1]['time'] + bk[-1]['duration'] < dur):
-                        bk[-1]['duration'] = dur - bk[-1]['time']
-
-                    if ch == 'scale': 
-                        cam_role['timeline'] = [{'tick': s['time'], 'active': s['value'][0] > 0.5} for s in bk]
-                    else:
-                        json_segs = []
-                        for s in bk:
-                            js = {
-                                'tick': round(s['time'], 2), 
-                                'duration': round(s['duration'], 2),
-                                'value': [round(x,4) for x in s['value']],
-                                'delta': [round(x,4) for x in s['delta']],
-                                'interp': s['interp']
-                            }
-                            if s['interp'] == 2:
-                                js['catmull'] = {ax: s.get(f'c{ax}') for ax in 'xyz' if f'c{ax}' in s}
-                            json_segs.append(js)
-                        cam_role[ch] = json_segs
+                        if bk and (bk[-1]['time'] + bk[-1]['duration'] < dur):
+                            bk[-1]['duration'] = dur - bk[-1]['time']
+
+                        if ch == 'scale': 
+                            cam_role['timeline'] = [{'tick': s['time'], 'active': s['value'][0] > 0.5} for s in bk]
+                        else:
+                            json_segs = []
+                            for s in bk:
+                                js = {
+                                    'tick': round(s['time'], 2), 
+                                    'duration': round(s['duration'], 2),
+                                    'value': [round(x,4) for x in s['value']],
+                                    'delta': [round(x,4) for x in s['delta']],
+                                    'interp': s['interp']
+                                }
+                                if s['interp'] == 2:
+                                    js['catmull'] = {ax: s.get(f'c{ax}') for ax in 'xyz' if f'c{ax}' in s}
+                                json_segs.append(js)
+                            cam_role[ch] = json_segs
                 
-                if cam_role: cams[key] = cam_role
-
-        out = {
-            'name': name,
-            'hash': ahash,
-            'duration': dur,
-            'settings': settings_out,
-            'streams': final_streams,
-            'cameras': cams,
-            'events': sorted(events, key=lambda x: x['tick'])
-        }
-        with open(os.path.join(config.OUT_DIR, f"{ahash}.json"), 'w') as f:
-            json.dump(out, f)
+                    if cam_role: cams[key] = cam_role
+
+            out = {
+                'name': name,
+                'hash': ahash,
+                'duration': dur,
+                'settings': settings_out,
+                'streams': final_streams,
+                **({'poseStride': config.POSE_STRIDE} if use_poses else {}),
+                **({'encoding': encoding} if encoding else {}),
+                **({'tiers': tiers_out, 'refine': refine_out} if tiers_out else {}),
+                'cameras': cams,
+                'events': sorted(events, key=lambda x: x['tick'])
+            }
+            with open(os.path.join(staging, f"{ahash}.json"), 'w') as f:
+                json.dump(out, f)
+
+            if config.TIERS:
+                stream_bytes = lambda streams: {r: sum(len(base64.b64decode(c)) for c in chunks) for r, chunks in streams.items()}
+                manifest.setdefault('tiers', {})[name] = [
+                    {'name': t, 'precision': v['precision'], 'bytes': stream_bytes(v['streams']), **({'refineBytes': stream_bytes(v['refine'])} if 'refine' in v else {})}
+                    for t, v in tiers_out.items()
+                ] + [{'name': 'full', 'precision': config.PRECISION, 'bytes': stream_bytes(final_streams), 'refineBytes': stream_bytes(refine_out)}]
+
+            progress.update(anim=name, stream=None, cost=costs, encoding=encoding)
+            progress['animations'] += 1
+            await asyncio.sleep(0)
+            yield dict(progress)
+
+        manifest['neededParts'] = {k: sorted(list(v)) for k, v in part_usage.items() if v}
+        with open(os.path.join(staging, "manifest.json"), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        os.makedirs(out_dir, exist_ok=True)
+        for f in os.listdir(staging):
+            os.replace(os.path.join(staging, f), os.path.join(out_dir, f))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
 
-    manifest['neededParts'] = {k: sorted(list(v)) for k, v in part_usage.items() if v}
-    with open(os.path.join(config.OUT_DIR, "manifest.json"), 'w') as f:
-        json.dump(manifest, f, indent=2)
+async def _run():
+    with open(config.MODEL_PATH, 'r', encoding='utf-8') as f:
+        model = json.load(f)
+
+    async for p in bake(model.get('animations', [])):
+        if p['stream'] is None:
+            print(f"-> {p['anim']} ({p['animations']}/{p['total']}, {p['segments']} segments, {p['bytes']} bytes)")
+            for role, report in p['cost'].items(): print(f"   {role}: {cost.summary(report)}")
+            if p['encoding']:
+                e = p['encoding']
+                print(f"   sent as {e['mode']} (segments {e['segments']['bytes']} bytes / tick {e['segments']['tickCost']}, "
+                      f"poses every {e['stride']} ticks {e['poses']['bytes']} bytes / tick {e['poses']['tickCost']}, "
+                      f"ping {e['segments']['pingCost']} vs {e['poses']['pingCost']}, max error {e['poses']['maxError']})")
+
+def run():
+    print("Baking...")
+    asyncio.run(_run())
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    compare_layouts() if '--compare' in sys.argv else run()
\ No newline at end of file
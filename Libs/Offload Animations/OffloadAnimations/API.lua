@@ -45,13 +45,14 @@ OffloadAnimations.manafestLoaded = false
 --- @param animationName string The key name of the animation (from manifest.json).
 --- @param role string|nil The role to play (defaults to "player1").
 --- @param speed number|nil Playback speed multiplier (defaults to 1.0).
-function OffloadAnimations.playAnimation(animationName, role, speed)
+--- @param tier string|nil The LOD tier to start on (defaults to "full"), finer tiers are streamed in after it while it plays.
+function OffloadAnimations.playAnimation(animationName, role, speed, tier)
     if not OffloadAnimations.manafestLoaded then
         RuzUtils.log("Please wait for the manafest to load before trying to play an animation", "yellow", LocalConfig.LOG_PREFIX_JSON)
         return
     end
 
-    local animData = Loader.getAnimation(animationName, role)
+    local animData = Loader.getAnimation(animationName, role, tier)
     if not animData then
         RuzUtils.log("OffloadAnimations Error: Could not load animation data for '" .. tostring(animationName) .. "'", "red", LocalConfig.LOG_PREFIX_JSON)
         return
@@ -101,9 +102,17 @@ end
 --- Retrieves the raw data for a specific animation and role.
 --- @param animationName string
 --- @param role string|nil
+--- @param tier string|nil
 --- @return table|nil
-function OffloadAnimations.getAnimation(animationName, role)
-    return Loader and Loader.getAnimation(animationName, role) or nil
+function OffloadAnimations.getAnimation(animationName, role, tier)
+    return Loader and Loader.getAnimation(animationName, role, tier) or nil
+end
+
+--- Returns the LOD tiers baked for an animation, coarsest first and ending with "full".
+--- @param animationName string
+--- @return table[]
+function OffloadAnimations.getAnimationTiers(animationName)
+    return Loader and Loader.getTiers(animationName) or {}
 end
 
 --- Retrieves the raw data for an animation containing all role streams.
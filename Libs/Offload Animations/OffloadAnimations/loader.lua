@@ -99,12 +99,33 @@ end
 --- Retrieves an animation object for a role.
 --- @param name string The name of the animation.
 --- @param role string|nil The role identifier (defaults to "player1").
---- @return table|nil result An object containing the 'chunks' specific to the role, or nil if not found.
-function AnimationLoader.getAnimation(name, role)
+--- @param tier string|nil A LOD tier name from the manifest (defaults to the "full" stream).
+--- @return table|nil result An object containing the 'chunks' specific to the role (and 'stride' when they hold a pose table) plus the 'refinements' up to the full animation, or nil if not found.
+function AnimationLoader.getAnimation(name, role, tier)
     role = role or "player1"
-    return _resolve(name, name .. "_" .. role, function(raw)
-        local stream = raw.streams and raw.streams[role]
-        return stream and { chunks = stream } or nil
+    tier = tier or "full"
+    return _resolve(name, name .. "_" .. role .. "_" .. tier, function(raw)
+        local source = raw
+        if tier ~= "full" then source = raw.tiers and raw.tiers[tier] end
+
+        local stream = source and source.streams and source.streams[role]
+        if not stream then return nil end
+
+        -- Each finer tier after the picked one (ending with the full animation) as just the channels it changes
+        local refinements = {}
+        local after = false
+        for _, entry in ipairs(AnimationLoader.getTiers(name)) do
+            if after then
+                local finer = entry.name == "full" and raw or (raw.tiers or {})[entry.name]
+                local chunks = finer and finer.refine and finer.refine[role]
+                if chunks then
+                    refinements[#refinements+1] = { chunks = chunks, precision = finer.precision, stride = finer.poseStride }
+                end
+            end
+            after = after or entry.name == tier
+        end
+
+        return { chunks = stream, precision = source.precision, stride = source.poseStride, refinements = refinements }
     end)
 end
 
@@ -131,6 +152,13 @@ function AnimationLoader.getAllAnimationNames()
     return names
 end
 
+--- Returns the LOD tiers baked for an animation, coarsest first and ending with "full".
+--- @param name string The name of the animation.
+--- @return table[] result A list of { name, precision, bytes = { [role] = size }, refineBytes = { [role] = size } }, empty if the animation has no tiers.
+function AnimationLoader.getTiers(name)
+    return animationManifest.tiers and animationManifest.tiers[name] or {}
+end
+
 --- Returns the ID map from the manifest { "Head"=1, "Body"=2 }
 function AnimationLoader.getManifestIDs()
     return animationManifest.ids
@@ -16,6 +16,7 @@ local INTERP = { LINEAR = 1, CATMULL = 2, BEZIER = 3 }
 ---@field eventsFired boolean[] helper to track fired events.
 ---@field overrideVanilla boolean Whether vanilla parts are hidden.
 ---@field readContext table|nil Decoding context for stream reader.
+---@field refine table|nil A finer tier being received, with its own transforms and readContext.
 ---@field onComplete function|nil Optional callback to run when the animation finishes.
 AnimationPlayer.activeState = nil
 
@@ -75,9 +76,21 @@ local function _solveMath(seg, t)
     return v
 end
 
+--- Blends the two pose samples around the given time, holding the last one past the end.
+local function _processPoses(part, channelName, poses, time)
+    local f = time / poses.stride
+    local i = math.floor(f)
+    local a = poses[math.min(i + 1, #poses)]
+    local b = poses[math.min(i + 2, #poses)]
+    local t = f - i
+
+    _apply(part, channelName, { a[1] + (b[1]-a[1])*t, a[2] + (b[2]-a[2])*t, a[3] + (b[3]-a[3])*t })
+end
+
 --- Finds the active keyframe segment and applies it to the part.
 local function _processChannel(part, channelName, segments, time)
     if #segments == 0 then return end
+    if segments.stride then return _processPoses(part, channelName, segments, time) end
 
     local seg = segments[1]
     if time >= segments[#segments].time then
@@ -188,17 +201,42 @@ function AnimationPlayer.update(delta)
     end
 end
 
-function pings.anim_header(start, override, speed, dur, initiator)
+function pings.anim_header(start, override, speed, dur, initiator, precision, stride)
     AnimationPlayer.play({ duration = dur }, speed, override, start, initiator)
     
     AnimationPlayer.activeState.readContext = {
-        lastPartId = -1, lastChId = -1, lastTime = 0, expectedVal = {0,0,0}, initiator = initiator
+        lastPartId = -1, lastChId = -1, lastTime = 0, expectedVal = {0,0,0}, initiator = initiator, precision = precision, stride = stride
     }
 end
 
+function pings.anim_refine(precision, stride)
+    local state = AnimationPlayer.activeState
+    if not state then return end
+
+    state.refine = {
+        transforms = {},
+        hasReadHeader = false,
+        readContext = { lastPartId = -1, lastChId = -1, lastTime = 0, expectedVal = {0,0,0}, precision = precision, stride = stride }
+    }
+end
+
+--- Replaces the channels of the playing animation with the ones of the refinement that just finished arriving.
+function pings.anim_merge()
+    local state = AnimationPlayer.activeState
+    if not (state and state.refine) then return end
+
+    for partKey, channels in pairs(state.refine.transforms) do
+        local partTfs = state.transforms[partKey] or {}
+        state.transforms[partKey] = partTfs
+        for chName, list in pairs(channels) do partTfs[chName] = list end
+    end
+    state.refine = nil
+end
+
 function pings.anim_chunk(data)
-    if AnimationPlayer.activeState then
-        StreamManager.decodeChunkIntoState(data, AnimationPlayer.activeState)
+    local state = AnimationPlayer.activeState
+    if state then
+        StreamManager.decodeChunkIntoState(data, state.refine or state)
     end
 end
 
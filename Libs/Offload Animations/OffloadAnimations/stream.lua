@@ -16,12 +16,13 @@ local CHANNEL_IDS = { "position", "rotation", "scale" }
 local sendQueue = {} 
 local PartIDToName = {}
 
-local function read_vec3(data, cursor)
+local function read_vec3(data, cursor, precision)
     local v = {0, 0, 0}
     local raw_val
+    precision = precision or LocalConfig.PRECISION
     for i = 1, 3 do
         raw_val, cursor = Codec.read_varint(data, cursor)
-        v[i] = raw_val / LocalConfig.PRECISION
+        v[i] = raw_val / precision
     end
     return v, cursor
 end
@@ -74,11 +75,11 @@ local function read_segment(data, cursor, context)
     if isInheritVal then
         seg.value = { table.unpack(context.expectedVal) }
     else
-        seg.value, cursor = read_vec3(data, cursor)
+        seg.value, cursor = read_vec3(data, cursor, context.precision)
     end
 
     if not isZeroDelta then
-        seg.delta, cursor = read_vec3(data, cursor)
+        seg.delta, cursor = read_vec3(data, cursor, context.precision)
     end
 
     for i=1,3 do context.expectedVal[i] = seg.value[i] + seg.delta[i] end
@@ -105,6 +106,40 @@ local function read_segment(data, cursor, context)
     return seg, cursor, context.lastPartId, context.lastChId
 end
 
+local function read_pose_record(data, cursor, context)
+    local packed = string.byte(data, cursor)
+    cursor = cursor + 1
+
+    local start, count
+    start, cursor = Codec.read_varint(data, cursor)
+    count, cursor = Codec.read_varint(data, cursor)
+
+    -- Every sample is stored as its change from the one before, starting from zero in each record
+    local poses, v, d = {}, {0, 0, 0}
+    for i = 1, count do
+        d, cursor = read_vec3(data, cursor, context.precision)
+        v = { v[1] + d[1], v[2] + d[2], v[3] + d[3] }
+        poses[i] = v
+    end
+
+    return poses, start, cursor, bit32.rshift(packed, 3), bit32.band(packed, 0x07)
+end
+
+--- Returns the timeline list of a part channel in the animation state, or nil if the part is not animated here.
+local function channel_list(animationState, pId, cId)
+    local partName = PartIDToName[pId]
+    if not (partName and CHANNEL_IDS[cId] and LocalConfig.data.modelParts[partName]) then return nil end
+
+    local tfs = animationState.transforms
+    local partTfs = tfs[partName] or {}
+    tfs[partName] = partTfs
+
+    local channel = CHANNEL_IDS[cId]
+    local list = partTfs[channel] or {}
+    partTfs[channel] = list
+    return list
+end
+
 --- @param codec CodecModule
 --- @param localConfig OAConfig
 function StreamManager.init(codec, localConfig)
@@ -131,7 +166,7 @@ function StreamManager.setBandwidthLimit(bytesPerSecond)
 end
 
 --- Prepares and queues an animation for streaming.
---- @param animationData table The animation object containing chunks.
+--- @param animationData table The animation object containing chunks, the tier precision if it is not the full stream, the stride of a pose table and any refinements.
 --- @param speed number The playback speed multiplier.
 --- @param overrideVanilla boolean Whether to hide vanilla model parts.
 --- @param initiator string The name of the initiator of the animation
@@ -152,13 +187,23 @@ function StreamManager.sendAnimation(animationData, speed, overrideVanilla, init
     --- @diagnostic disable-next-line
     local playStartTime = world:getTime() + ticksNeeded + 20
 
+    -- Refinements go out after the picked tier, so playback starts as soon as that one has arrived
+    local parts = { { chunks = rawChunks } }
+    for _, refinement in ipairs(animationData.refinements or {}) do
+        local raw = {}
+        for i, b64 in ipairs(refinement.chunks) do raw[i] = Codec.base64_decode(b64) end
+        parts[#parts+1] = { chunks = raw, precision = refinement.precision, stride = refinement.stride }
+    end
+
     sendQueue[animationData.hash] = { 
+        parts = parts,
+        part = 1,
         chunks = rawChunks, 
         nextChunk = 1, 
         timer = 0 
     }
 
-    pings.anim_header(playStartTime, overrideVanilla, speed, animationData.duration, initiator)
+    pings.anim_header(playStartTime, overrideVanilla, speed, animationData.duration, initiator, animationData.precision, animationData.stride)
     return playStartTime
 end
 
@@ -190,7 +235,17 @@ function StreamManager.update(delta)
             end
 
             if queue.nextChunk > #queue.chunks then
-                sendQueue[hash] = nil
+                -- A refinement is only swapped in once all of it has arrived, then the next one starts
+                if queue.part > 1 then pings.anim_merge() end
+                queue.part = queue.part + 1
+
+                local nextPart = queue.parts[queue.part]
+                if nextPart then
+                    queue.chunks, queue.nextChunk = nextPart.chunks, 1
+                    pings.anim_refine(nextPart.precision, nextPart.stride)
+                else
+                    sendQueue[hash] = nil
+                end
             end
         end
     end
@@ -215,27 +270,27 @@ function StreamManager.decodeChunkIntoState(data, animationState)
         animationState.hasReadHeader = true
     end
 
-    while cursor <= #data do
-        local segment, newCursor, pId, cId = read_segment(data, cursor, ctx)
-        if not segment then break end
-        cursor = newCursor
+    -- Pose table streams hold plain samples every ctx.stride ticks instead of segments
+    if ctx.stride then
+        while cursor <= #data do
+            local poses, start, newCursor, pId, cId = read_pose_record(data, cursor, ctx)
+            cursor = newCursor
 
-        local partName = PartIDToName[pId]
-
-        if partName and CHANNEL_IDS[cId] then
-            if LocalConfig.data.modelParts[partName] then
-                local channel = CHANNEL_IDS[cId]
-                local tfs = animationState.transforms
-                
-                local partTfs = tfs[partName] or {}
-                tfs[partName] = partTfs
-                
-                local list = partTfs[channel] or {}
-                partTfs[channel] = list
-                
-                list[#list+1] = segment
+            local list = channel_list(animationState, pId, cId)
+            if list then
+                list.stride = ctx.stride
+                for i, pose in ipairs(poses) do list[start + i] = pose end
             end
         end
+    else
+        while cursor <= #data do
+            local segment, newCursor, pId, cId = read_segment(data, cursor, ctx)
+            if not segment then break end
+            cursor = newCursor
+
+            local list = channel_list(animationState, pId, cId)
+            if list then list[#list+1] = segment end
+        end
     end
     animationState.readContext = ctx 
 end
@@ -1,4 +1,4 @@
-import json, hashlib, struct, base64, shutil, os
+import json, hashlib, struct, base64, shutil, os, asyncio, math, re
 from js import document, console, Uint8Array, window
 from pyodide.ffi import create_proxy
 
@@ -10,12 +10,20 @@ class Config:
     PART_MAP = {}
     SETTINGS = []
     CAMERAS = {}
+    TIERS = []
     
     @staticmethod
     def get_part_ids():
         parts = sorted({p for role in config.PART_MAP.values() for p in role.keys()})
         return {p: i + 1 for i, p in enumerate(parts)}
 
+    @staticmethod
+    def get_bone_index():
+        index = {}
+        for role, parts in config.PART_MAP.items():
+            for internal, bb in parts.items(): index.setdefault(bb, (role, internal))
+        return index
+
 config = Config()
 
 DEF_MAP = {
@@ -24,9 +32,11 @@ DEF_MAP = {
 }
 DEF_SET = ['overrideVanilla', 'lockMovement', 'useCamera']
 DEF_CAM = {'shared': 'sharedCamera', 'player1': 'P1Camera', 'player2': 'P2Camera'}
+DEF_TIERS = []
 
 MODEL_DATA = None
 ANIM_CACHE = {}
+BAKE_CANCELLED = False
 
 def log(m):
     c = document.getElementById("console")
@@ -38,6 +48,7 @@ def reset_config(e=None):
     document.getElementById("cfg_prec").value = "1000"
     document.getElementById("cfg_settings").value = json.dumps(DEF_SET)
     document.getElementById("cfg_cameras").value = json.dumps(DEF_CAM, indent=2)
+    document.getElementById("cfg_tiers").value = json.dumps(DEF_TIERS)
 
     # Call JS function via window
     window.partMap = window.JSON.parse(json.dumps(DEF_MAP))
@@ -53,6 +64,7 @@ def read_config():
         config.PART_MAP = window.getPartMapFromTable().to_py()
         config.SETTINGS = json.loads(document.getElementById("cfg_settings").value)
         config.CAMERAS = json.loads(document.getElementById("cfg_cameras").value)
+        config.TIERS = json.loads(document.getElementById("cfg_tiers").value or "[]")
         return True
     except Exception as e:
         log(f"Config Error: {e}")
@@ -60,7 +72,30 @@ def read_config():
 
 reset_config()
 
+_rad = math.radians
+_deg = math.degrees
+MOLANG_FUNCS = {
+    'math.abs': abs, 'math.sqrt': lambda a: math.sqrt(max(a, 0)),
+    'math.sin': lambda a: math.sin(_rad(a)), 'math.cos': lambda a: math.cos(_rad(a)),
+    'math.asin': lambda a: _deg(math.asin(max(-1, min(1, a)))), 'math.acos': lambda a: _deg(math.acos(max(-1, min(1, a)))),
+    'math.atan': lambda a: _deg(math.atan(a)), 'math.atan2': lambda a, b: _deg(math.atan2(a, b)),
+    'math.exp': math.exp, 'math.ln': lambda a: math.log(a) if a > 0 else 0.0, 'math.pow': lambda a, b: a ** b,
+    'math.floor': math.floor, 'math.ceil': math.ceil, 'math.round': lambda a: math.floor(a + 0.5), 'math.trunc': math.trunc,
+    'math.min': min, 'math.max': max, 'math.mod': lambda a, b: math.fmod(a, b) if b else 0.0,
+    'math.clamp': lambda v, a, b: max(a, min(b, v)), 'math.lerp': lambda a, b, t: a + (b - a) * t,
+    'math.lerprotate': lambda a, b, t: a + ((b - a + 180) % 360 - 180) * t,
+    'math.hermite_blend': lambda t: 3 * t * t - 2 * t * t * t,
+    'math.random': lambda a, b: (a + b) / 2, 'math.random_integer': lambda a, b: math.floor((a + b) / 2),
+}
+MOLANG_CONSTS = {'math.pi': math.pi, 'true': 1.0, 'false': 0.0}
+MOLANG_TIME = {'query.anim_time', 'q.anim_time', 'query.life_time', 'q.life_time'}
+MOLANG_TOKEN = re.compile(r'\s*(?:(\d+\.?\d*|\.\d+)|([a-z_][a-z0-9_.]*)|(&&|\|\||==|!=|<=|>=|[-+*/()<>!?:,]))')
+MOLANG_BINARY = {'||': 2, '&&': 3, '==': 4, '!=': 4, '<': 5, '<=': 5, '>': 5, '>=': 5, '+': 6, '-': 6, '*': 7, '/': 7}
+
 class Compiler:
+    def __init__(self):
+        self.molang_cache = {}
+
     def safe_float(self, val, default=0.0):
         try: return float(val)
         except (ValueError, TypeError): return default
@@ -76,6 +111,108 @@ class Compiler:
             p1
         ]
 
+    def molang_source(self, expr):
+        expr = expr.lower().strip().rstrip(';')
+        if expr.startswith('return '): expr = expr[7:]
+
+        tokens, pos = [], 0
+        while pos < len(expr):
+            m = MOLANG_TOKEN.match(expr, pos)
+            if not m or m.end() == pos: raise ValueError(f"bad molang near '{expr[pos:]}'")
+            tokens.append(m.group(1) and ('num', m.group(1)) or m.group(2) and ('name', m.group(2)) or ('op', m.group(3)))
+            pos = m.end()
+            while pos < len(expr) and expr[pos].isspace(): pos += 1
+
+        def peek(): return tokens[0] if tokens else ('end', None)
+        def take(op):
+            if peek() != ('op', op): raise ValueError(f"expected '{op}'")
+            tokens.pop(0)
+
+        def atom():
+            kind, val = tokens.pop(0) if tokens else ('end', None)
+            if kind == 'num': return repr(float(val))
+            if kind == 'op' and val == '(':
+                inner = parse(0); take(')')
+                return f"({inner})"
+            if kind == 'op' and val == '-': return f"(-{parse(8)})"
+            if kind == 'op' and val == '!': return f"float(not {parse(8)})"
+            if kind == 'name':
+                if peek() == ('op', '('):
+                    if val not in MOLANG_FUNCS: raise ValueError(f"unknown function '{val}'")
+                    tokens.pop(0)
+                    args = []
+                    while peek() != ('op', ')'):
+                        args.append(parse(0))
+                        if peek() == ('op', ','): tokens.pop(0)
+                    take(')')
+                    return f"_f[{val!r}]({', '.join(args)})"
+                if val in MOLANG_TIME: return "_t"
+                if val in MOLANG_CONSTS: return repr(MOLANG_CONSTS[val])
+                return "0.0"
+            raise ValueError(f"unexpected '{val}'" if val else "unexpected end")
+
+        def parse(min_prec):
+            left = atom()
+            while True:
+                kind, op = peek()
+                if kind == 'op' and op == '?' and min_prec <= 1:
+                    tokens.pop(0)
+                    a = parse(1); take(':'); b = parse(1)
+                    left = f"(({a}) if ({left}) else ({b}))"
+                elif kind == 'op' and op in MOLANG_BINARY and MOLANG_BINARY[op] > min_prec:
+                    tokens.pop(0)
+                    right = parse(MOLANG_BINARY[op])
+                    if op == '/': left = f"_div({left}, {right})"
+                    elif op == '&&': left = f"float(bool({left}) and bool({right}))"
+                    elif op == '||': left = f"float(bool({left}) or bool({right}))"
+                    elif op in ('+', '-', '*'): left = f"({left} {op} {right})"
+                    else: left = f"float({left} {op} {right})"
+                else:
+                    return left
+
+        src = parse(0)
+        if tokens: raise ValueError(f"unexpected '{tokens[0][1]}'")
+        return src
+
+    def compile_molang(self, expr):
+        if expr in self.molang_cache: return self.molang_cache[expr]
+        div = lambda a, b: a / b if b else 0.0
+        try:
+            fn = eval(f"lambda _t: {self.molang_source(expr)}", {'__builtins__': {}, 'float': float, 'bool': bool, '_f': MOLANG_FUNCS, '_div': div})
+            def sample(t):
+                try: return float(fn(t))
+                except (ArithmeticError, ValueError, TypeError): return 0.0
+        except (ValueError, SyntaxError) as e:
+            log(f"Molang '{expr}' not baked: {e}")
+            sample = None
+        self.molang_cache[expr] = sample
+        return sample
+
+    def is_molang(self, val):
+        return isinstance(val, str) and val.strip() != '' and self.safe_float(val, None) is None
+
+    def molang_vec(self, dp, keys='xyz'):
+        fns = [self.compile_molang(dp.get(k)) if self.is_molang(dp.get(k)) else None for k in keys]
+        if not any(fns): return None
+        consts = self.get_vec(dp, keys)
+        return lambda t: [f(t) if f else c for f, c in zip(fns, consts)]
+
+    def keyframe_vec(self, kf):
+        # A keyframe's value at its own time, molang axes are evaluated there
+        dp = kf['data_points'][0]
+        ev = self.molang_vec(dp)
+        return ev(self.safe_float(kf['time'])) if ev else self.get_vec(dp)
+
+    def sample_span(self, start, end, eval_a, eval_b):
+        if end <= start: return [(start, eval_a(start / config.TICKS))]
+        ticks = [start + n for n in range(int(math.ceil(end - start)))] + [end]
+        length = (end - start) or 1
+        pts = []
+        for t in ticks:
+            a, b, alpha = eval_a(t / config.TICKS), eval_b(t / config.TICKS), (t - start) / length
+            pts.append((t, [x + (y - x) * alpha for x, y in zip(a, b)]))
+        return pts
+
     def sq_dist(self, a, b): 
         return sum((x-y)**2 for x, y in zip(a, b))
 
@@ -87,10 +224,11 @@ class Compiler:
             zigzag >>= 7
         buf.append(zigzag)
 
-    def bake_channel(self, keyframes, channel_name):
+    def bake_channel(self, keyframes, channel_name, end_time=None):
+        # Keyframes arrive time sorted from index_animation
         if not keyframes: return []
         
-        kfs = sorted(keyframes, key=lambda k: self.safe_float(k['time']))
+        kfs = keyframes
         count = len(kfs)
         segs = []
 
@@ -113,6 +251,24 @@ class Compiler:
             mode = interp_map.get(cur.get('interpolation'), 1)
             if is_last: mode = 1
 
+            # Spans touching a molang keyframe are sampled every tick and thinned out by simplify_segments
+            # A plain catmull keyframe keeps its curve and only needs the molang neighbour's value at its time
+            ev_cur, ev_nxt = self.molang_vec(dp_cur), self.molang_vec(dp_nxt)
+            if ev_cur or (ev_nxt and mode != 2):
+                const_cur, const_nxt = self.get_vec(dp_cur), p2
+                end = t_nxt if not is_last else max(t_cur, end_time or t_cur)
+                pts = self.sample_span(t_cur, end, ev_cur or (lambda t: const_cur), ev_nxt or (lambda t: const_nxt))
+                if channel_name == 'camera_scale':
+                    pts = [(t, [1.0 if (sum(v) / 3.0) > 0.1 else 0.0] * 3) for t, v in pts]
+
+                for (ta, va), (tb, vb) in zip(pts, pts[1:]):
+                    segs.append({'time': ta, 'duration': tb - ta, 'value': va, 'delta': [b-a for a, b in zip(va, vb)], 'interp': 1, 'sampled': True})
+                if is_last:
+                    segs.append({'time': pts[-1][0], 'duration': 0, 'value': pts[-1][1], 'delta': [0, 0, 0], 'interp': 1, 'sampled': True})
+                continue
+
+            if ev_nxt: p2 = self.keyframe_vec(nxt)
+
             seg = {
                 'time': t_cur, 'duration': max(0, t_nxt - t_cur),
                 'value': p1, 'delta': [b-a for a, b in zip(p1, p2)],
@@ -120,12 +276,12 @@ class Compiler:
             }
 
             if mode == 2: # Catmull
-                prev = kfs[i-1]['data_points'][0] if i > 0 else dp_cur
-                pp = kfs[i+2]['data_points'][0] if i < count - 2 else dp_nxt
+                prev = self.keyframe_vec(kfs[i-1] if i > 0 else cur)
+                pp = self.keyframe_vec(kfs[i+2] if i < count - 2 else nxt)
                 
                 seg['coeffs'] = []
                 for j, ax in enumerate('xyz'):
-                    c = self.catmull_coeff(self.safe_float(prev.get(ax)), p1[j], p2[j], self.safe_float(pp.get(ax)))
+                    c = self.catmull_coeff(prev[j], p1[j], p2[j], pp[j])
                     seg['coeffs'].extend(c)
 
             elif mode == 3: # Bezier
@@ -143,10 +299,11 @@ class Compiler:
 
     def simplify_segments(self, segs, threshold=0.002**2):
         if len(segs) < 3: return segs
+        timed = any(s.get('sampled') for s in segs)
 
         cleaned = [segs[0]]
         for s in segs[1:]:
-            if self.sq_dist(s['value'], cleaned[-1]['value']) > 1e-5:
+            if timed or self.sq_dist(s['value'], cleaned[-1]['value']) > 1e-5:
                 cleaned.append(s)
         if cleaned[-1] is not segs[-1]: cleaned.append(segs[-1])
 
@@ -160,7 +317,10 @@ class Compiler:
                 if pts[i]['interp'] != 1: return pts # Don't simplify curves
                 
                 curr = pts[i]['value']
-                if denom == 0:
+                if timed:
+                    t = (pts[i]['time'] - pts[0]['time']) / ((pts[-1]['time'] - pts[0]['time']) or 1)
+                    d = self.sq_dist(curr, [s + t*(e-s) for s,e in zip(start, end)])
+                elif denom == 0:
                     d = self.sq_dist(curr, start)
                 else:
                     t = max(0, min(1, sum((c-s)*(e-s) for c,s,e in zip(curr, start, end)) / denom))
@@ -186,7 +346,8 @@ class Compiler:
                 
         return simplified
 
-    def serialize_stream(self, segments, duration):
+    def serialize_stream(self, segments, duration, precision=None):
+        precision = precision or config.PRECISION
         segments.sort(key=lambda x: (x['tick'], x['pid'], x['cid']))
         chunks = []
         buf = bytearray(struct.pack('>hh', duration, len(segments)))
@@ -195,7 +356,7 @@ class Compiler:
 
         for item in segments:
             s = item['data']
-            to_int = lambda v: [int(round(x * config.PRECISION)) for x in v]
+            to_int = lambda v: [int(round(x * precision)) for x in v]
             
             val_i = to_int(s['value'])
             delta_i = to_int(s['delta'])
@@ -243,8 +404,83 @@ class Compiler:
         if buf: chunks.append(base64.b64encode(buf).decode('ascii'))
         return chunks
 
+    def segment_value(self, seg, t):
+        # Same maths as player.lua _solveMath
+        s, d = seg['value'], seg['delta']
+        if seg['interp'] == 2:
+            c = seg['coeffs']
+            return [((c[4*j] * t + c[4*j+1]) * t + c[4*j+2]) * t + c[4*j+3] for j in range(3)]
+        if seg['interp'] == 3:
+            out = []
+            for j, b in enumerate(seg['bezier']):
+                p0, p1, p2, p3 = s[j], s[j] + b['rv'], s[j] + d[j] + b['lv'], s[j] + d[j]
+                u = 1 - t
+                out.append(u*u*u*p0 + 3*u*u*t*p1 + 3*u*t*t*p2 + t*t*t*p3)
+            return out
+        return [a + b * t for a, b in zip(s, d)]
+
+    def channel_value(self, segs, time):
+        # Same lookup as player.lua _processChannel
+        seg = next((s for s in reversed(segs) if time >= int(s['time'])), segs[0])
+        start, dur = int(seg['time']), int(seg['duration'])
+        if time >= start + dur: return [a + b for a, b in zip(seg['value'], seg['delta'])]
+        return self.segment_value(seg, min(1, max(0, (time - start) / dur)))
+
+    def refine_items(self, coarser, fine, duration, thresholds):
+        # The channels of `fine` that any coarser tier (precision, items), as a client decodes it, strays too far from.
+        # A client holds whichever tier it started on or last refined a channel with, so all of them have to be close
+        def by_channel(items):
+            out = {}
+            for item in sorted(items, key=lambda x: (x['tick'], x['pid'], x['cid'])):
+                out.setdefault((item['pid'], item['cid']), []).append(item['data'])
+            return out
+
+        keep, seen = set(), set()
+        for precision, coarse in coarser:
+            q = lambda v: [round(x * precision) / precision for x in v]
+            old = {key: [dict(s, value=q(s['value']), delta=q(s['delta'])) for s in segs] for key, segs in by_channel(coarse).items()}
+            for key, segs in by_channel(fine).items():
+                # A tier without the channel can't be what a client holds, the refinement that first adds it is
+                if key in keep or key not in old: continue
+                seen.add(key)
+                for t in range(int(duration) + 1):
+                    if self.sq_dist(self.channel_value(old[key], t), self.channel_value(segs, t)) > thresholds[key[1]]:
+                        keep.add(key); break
+        return [item for item in fine if (item['pid'], item['cid']) in keep or (item['pid'], item['cid']) not in seen]
+
 compiler = Compiler()
 
+def index_animation(anim):
+    # One pass over the raw animation, cached on load and read by every later stage
+    raw = json.dumps(anim, sort_keys=True, separators=(',', ':'))
+    bones = {}
+    max_time = 0
+    events = []
+
+    for anim_node in anim.get('animators', {}).values():
+        if anim_node.get('type') == 'effect':
+            for k in anim_node['keyframes']:
+                if k.get('channel') == 'timeline':
+                    dp = k.get('data_points', [{}])[0]
+                    events.append({'time': compiler.safe_float(k['time']), 'script': dp.get('script', '')})
+            continue
+
+        channels = {}
+        active = False
+        for k in anim_node['keyframes']:
+            t = compiler.safe_float(k['time'])
+            max_time = max(max_time, t)
+            channels.setdefault(k['channel'], []).append((t, k))
+            if k['channel'] == 'scale' and not active:
+                active = sum(compiler.get_vec(k['data_points'][0])) / 3.0 > 0.1
+
+        bones[anim_node['name']] = {
+            'channels': {ch: [k for _, k in sorted(kfs, key=lambda x: x[0])] for ch, kfs in channels.items()},
+            'active': active
+        }
+
+    return {'name': anim['name'], 'hash': hashlib.sha256(raw.encode()).hexdigest(), 'max_time': max_time, 'events': events, 'bones': bones}
+
 def get_structure(model):
     els = {e['uuid']:e for e in model.get('elements',[])}
     def parse(n):
@@ -280,15 +516,7 @@ async def load_model(e):
     
     for anim in anims:
         name = anim['name']
-        parts = {}
-        max_t = 0
-        for k,v in anim.get('animators',{}).items():
-            if v.get('type')!='effect':
-                parts[v['name']] = v['keyframes']
-                for kf in v['keyframes']: max_t = max(max_t, compiler.safe_float(kf['time']))
-        
-        dur = int(max_t * config.TICKS)
-        ANIM_CACHE[name] = {'raw': parts, 'duration': dur, 'obj': anim}
+        ANIM_CACHE[name] = index_animation(anim)
         
         div = document.createElement("div")
         div.className = "anim-row"
@@ -299,7 +527,9 @@ async def load_model(e):
         
         def click(evt, n=name):
             if not read_config(): return
-            window.playAnim(json.dumps({'name':n, 'duration':ANIM_CACHE[n]['duration'], 'raw_parts':ANIM_CACHE[n]['raw']}), config.TICKS)
+            ir = ANIM_CACHE[n]
+            raw_parts = {b: [k for kfs in v['channels'].values() for k in kfs] for b, v in ir['bones'].items()}
+            window.playAnim(json.dumps({'name':n, 'duration':int(ir['max_time'] * config.TICKS), 'raw_parts':raw_parts}), config.TICKS)
             for x in document.getElementsByClassName("anim-row"): x.classList.remove("active")
             evt.currentTarget.classList.add("active")
             
@@ -311,112 +541,166 @@ async def load_model(e):
         
     document.getElementById("btnBake").disabled = False
 
+async def bake(animations, out_dir):
+    part_ids = config.get_part_ids()
+    bone_index = config.get_bone_index()
+    manifest = {'anims': {}, 'neededParts': {}, 'ids': part_ids}
+    part_usage = {k: set() for k in part_ids}
+    progress = {'anim': None, 'stream': None, 'animations': 0, 'total': len(animations), 'segments': 0, 'bytes': 0}
+
+    # Everything goes to a staging folder that only replaces out_dir once all animations are baked
+    staging = out_dir.rstrip('/') + '.partial'
+    if os.path.exists(staging): shutil.rmtree(staging)
+    os.makedirs(staging)
+
+    try:
+        for ir in animations:
+            name, ahash = ir['name'], ir['hash']
+            manifest['anims'][name] = ahash
+
+            bones = ir['bones']
+            dur = int(ir['max_time'] * config.TICKS)
+            events = [{'tick': int(e['time']*config.TICKS), 'script': e['script']} for e in ir['events']]
+
+            check_active = lambda bone_name: bones.get(bone_name, {}).get('active', False)
+            settings_out = {s_key: check_active(s_key) for s_key in config.SETTINGS}
+            settings_out['cameras'] = {}
+            if settings_out.get('useCamera'):
+                for key, bone in config.CAMERAS.items(): settings_out['cameras'][key] = check_active(bone)
+            else:
+                for key in config.CAMERAS: settings_out['cameras'][key] = False
+
+            def build_streams(tier):
+                streams = {}
+                for bb_name, bone in bones.items():
+                    role, internal = bone_index.get(bb_name, (None, None))
+                    if not role: continue
+                    if 'parts' in tier and internal not in tier['parts']: continue
+
+                    part_usage[internal].add(name)
+                    current_pid = part_ids[internal]
+                    channels = bone['channels']
+
+                    for ch_name in ['position', 'rotation', 'scale']:
+                        if ch_name not in channels: continue
+                        threshold = tier.get('rotation', 0.1) if ch_name == 'rotation' else tier.get('position', 0.002)
+                        segs = compiler.bake_channel(channels[ch_name], ch_name, dur)
+                        segs = compiler.simplify_segments(segs, threshold=threshold**2)
+                        if segs and (segs[-1]['time'] + segs[-1]['duration'] < dur): segs[-1]['duration'] = dur - segs[-1]['time']
+                        if role not in streams: streams[role] = []
+                        streams[role].append([{'tick': segs[0]['time'], 'pid': current_pid, 'cid': ['position', 'rotation', 'scale'].index(ch_name) + 1, 'data': s} for s in segs])
+                return {r: [x for sub in s for x in sub] for r, s in streams.items()}
+
+            streams = build_streams({})
+            final_streams = {}
+            for r, items in streams.items():
+                final_streams[r] = compiler.serialize_stream(items, dur)
+                progress.update(anim=name, stream=r)
+                progress['segments'] += len(items)
+                progress['bytes'] += sum(len(base64.b64decode(c)) for c in final_streams[r])
+                await asyncio.sleep(0)
+                yield dict(progress)
+
+            # Coarser self contained copies of the streams, so clients can start on a cheap tier first. Every
+            # finer tier (and the full stream) also gets a refinement: only the channels that moved past its
+            # thresholds against every coarser tier, which a client already playing one of those swaps in
+            thresholds = lambda tier: {1: tier.get('position', 0.002)**2, 2: tier.get('rotation', 0.1)**2, 3: tier.get('position', 0.002)**2}
+            tiers_out = {}
+            coarser = []
+            for tier in config.TIERS:
+                # Like the thresholds, a tier without its own precision uses the full one
+                precision = tier.get('precision', config.PRECISION)
+                tier_streams = build_streams(tier)
+                entry = tiers_out[tier['name']] = {'precision': precision, 'streams': {}}
+                if coarser: entry['refine'] = {}
+                for r, items in tier_streams.items():
+                    entry['streams'][r] = compiler.serialize_stream(items, dur, precision)
+                    if coarser:
+                        changed = compiler.refine_items([(p, c.get(r, [])) for p, c in coarser], items, dur, thresholds(tier))
+                        if changed: entry['refine'][r] = compiler.serialize_stream(changed, dur, precision)
+                    progress.update(anim=name, stream=f"{r}:{tier['name']}")
+                    await asyncio.sleep(0)
+                    yield dict(progress)
+                coarser.append((precision, tier_streams))
+
+            refine_out = {}
+            for r, items in (streams.items() if coarser else ()):
+                changed = compiler.refine_items([(p, c.get(r, [])) for p, c in coarser], items, dur, thresholds({}))
+                if changed: refine_out[r] = compiler.serialize_stream(changed, dur)
+            cams = {}
+            if settings_out.get('useCamera'):
+                for key, bone in config.CAMERAS.items():
+                    if not settings_out['cameras'].get(key): continue
+                    by_ch = bones.get(bone, {}).get('channels')
+                    if not by_ch: continue
+                    cam_role = {}
+                    for ch in ['position', 'rotation', 'scale']:
+                        if ch not in by_ch: continue
+                        mode_name = "camera_scale" if ch == "scale" else ch
+                        bk = compiler.bake_channel(by_ch[ch], mode_name, dur) 
+                        bk = compiler.simplify_segments(bk)
+                        if bk and (bk[-1]['time'] + bk[-1]['duration'] < dur): bk[-1]['duration'] = dur - bk[-1]['time']
+
+                        if ch == 'scale': cam_role['timeline'] = [{'tick': s['time'], 'active': s['value'][0] > 0.5} for s in bk]
+                        else:
+                            json_segs = []
+                            for s in bk:
+                                js = {'tick': round(s['time'], 2), 'duration': round(s['duration'], 2), 'value': [round(x,4) for x in s['value']], 'delta': [round(x,4) for x in s['delta']], 'interp': s['interp']}
+                                if s['interp'] == 2: js['catmull'] = {ax: s.get(f'c{ax}') for ax in 'xyz' if f'c{ax}' in s}
+                                json_segs.append(js)
+                            cam_role[ch] = json_segs
+                    if cam_role: cams[key] = cam_role
+
+            out = {'name': name, 'hash': ahash, 'duration': dur, 'settings': settings_out, 'streams': final_streams, **({'tiers': tiers_out, 'refine': refine_out} if tiers_out else {}), 'cameras': cams, 'events': sorted(events, key=lambda x: x['tick'])}
+            with open(os.path.join(staging, f"{ahash}.json"), 'w') as f: json.dump(out, f)
+
+            if config.TIERS:
+                stream_bytes = lambda streams: {r: sum(len(base64.b64decode(c)) for c in chunks) for r, chunks in streams.items()}
+                manifest.setdefault('tiers', {})[name] = [
+                    {'name': t, 'precision': v['precision'], 'bytes': stream_bytes(v['streams']), **({'refineBytes': stream_bytes(v['refine'])} if 'refine' in v else {})}
+                    for t, v in tiers_out.items()
+                ] + [{'name': 'full', 'precision': config.PRECISION, 'bytes': stream_bytes(final_streams), 'refineBytes': stream_bytes(refine_out)}]
+
+            progress.update(anim=name, stream=None)
+            progress['animations'] += 1
+            await asyncio.sleep(0)
+            yield dict(progress)
+
+        manifest['neededParts'] = {k: sorted(list(v)) for k, v in part_usage.items() if v}
+        with open(os.path.join(staging, "manifest.json"), 'w') as f: json.dump(manifest, f, indent=2)
+
+        if os.path.exists(out_dir): shutil.rmtree(out_dir)
+        os.replace(staging, out_dir)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def cancel_bake(e):
+    global BAKE_CANCELLED
+    BAKE_CANCELLED = True
+
 async def bake_selected(e):
+    global BAKE_CANCELLED
     if not MODEL_DATA or not read_config(): return
     sel = [n for n in ANIM_CACHE if document.getElementById(f"cb_{n}").checked]
     if not sel: return log("Select animations.")
     log(f"Baking {len(sel)} animations...")
-    
-    if os.path.exists("animations"): shutil.rmtree("animations")
-    os.makedirs("animations", exist_ok=True)
-    
-    part_ids = config.get_part_ids()
-    manifest = {'anims': {}, 'neededParts': {}, 'ids': part_ids}
-    part_usage = {k: set() for k in part_ids}
 
-    for name in sel:
-        anim = ANIM_CACHE[name]['obj']
-        raw = json.dumps(anim, sort_keys=True, separators=(',', ':'))
-        ahash = hashlib.sha256(raw.encode()).hexdigest()
-        manifest['anims'][name] = ahash
-        
-        raw_parts = {}
-        max_time = 0
-        events = []
-        
-        for anim_node in anim.get('animators', {}).values():
-            if anim_node.get('type') == 'effect':
-                for k in anim_node['keyframes']:
-                    if k.get('channel') == 'timeline':
-                        dp = k.get('data_points', [{}])[0]
-                        t_val = compiler.safe_float(k['time'])
-                        events.append({'tick': int(t_val*config.TICKS), 'script': dp.get('script', '')})
-            else:
-                raw_parts[anim_node['name']] = anim_node['keyframes']
-                for k in anim_node['keyframes']:
-                    max_time = max(max_time, compiler.safe_float(k['time']))
-        
-        dur = int(max_time * config.TICKS)
-        settings_out = {}
-        def check_active(bone_name):
-            kfs = raw_parts.get(bone_name, [])
-            for k in kfs:
-                if k.get('channel') == 'scale':
-                    dp = k['data_points'][0]
-                    val = (compiler.safe_float(dp.get('x',0)) + 
-                           compiler.safe_float(dp.get('y',0)) + 
-                           compiler.safe_float(dp.get('z',0))) / 3.0
-                    if val > 0.1: return True
-            return False
-
-        for s_key in config.SETTINGS: settings_out[s_key] = check_active(s_key)
-        settings_out['cameras'] = {}
-        if settings_out.get('useCamera'):
-            for key, bone in config.CAMERAS.items(): settings_out['cameras'][key] = check_active(bone)
-        else:
-            for key in config.CAMERAS: settings_out['cameras'][key] = False
-
-        streams = {}
-        for bb_name, kfs_list in raw_parts.items():
-            role, internal = next(((r, i) for r, map in config.PART_MAP.items() for i, bb in map.items() if bb == bb_name), (None, None))
-            if not role: continue
-            
-            part_usage[internal].add(name)
-            current_pid = part_ids[internal]
-            
-            channels = {}
-            for k in kfs_list: channels.setdefault(k['channel'], []).append(k)
-
-            for ch_name in ['position', 'rotation', 'scale']:
-                if ch_name not in channels: continue
-                segs = compiler.bake_channel(channels[ch_name], ch_name)
-                segs = compiler.simplify_segments(segs, threshold=0.1**2 if ch_name=='rotation' else 0.002**2)
-                if segs and (segs[-1]['time'] + segs[-1]['duration'] < dur): segs[-1]['duration'] = dur - segs[-1]['time']
-                if role not in streams: streams[role] = []
-                streams[role].append([{'tick': segs[0]['time'], 'pid': current_pid, 'cid': ['position', 'rotation', 'scale'].index(ch_name) + 1, 'data': s} for s in segs])
-
-        final_streams = {r: compiler.serialize_stream([x for sub in s for x in sub], dur) for r, s in streams.items()}
-        cams = {}
-        if settings_out.get('useCamera'):
-            for key, bone in config.CAMERAS.items():
-                if not settings_out['cameras'].get(key): continue
-                kfs = raw_parts.get(bone, [])
-                if not kfs: continue
-                cam_role = {}
-                by_ch = {}
-                for k in kfs: by_ch.setdefault(k['channel'], []).append(k)
-                for ch in ['position', 'rotation', 'scale']:
-                    if ch not in by_ch: continue
-                    mode_name = "camera_scale" if ch == "scale" else ch
-                    bk = compiler.bake_channel(by_ch[ch], mode_name) 
-                    bk = compiler.simplify_segments(bk)
-                    if bk and (bk[-1]['time'] + bk[-1]['duration'] < dur): bk[-1]['duration'] = dur - bk[-1]['time']
-
-                    if ch == 'scale': cam_role['timeline'] = [{'tick': s['time'], 'active': s['value'][0] > 0.5} for s in bk]
-                    else:
-                        json_segs = []
-                        for s in bk:
-                            js = {'tick': round(s['time'], 2), 'duration': round(s['duration'], 2), 'value': [round(x,4) for x in s['value']], 'delta': [round(x,4) for x in s['delta']], 'interp': s['interp']}
-                            if s['interp'] == 2: js['catmull'] = {ax: s.get(f'c{ax}') for ax in 'xyz' if f'c{ax}' in s}
-                            json_segs.append(js)
-                        cam_role[ch] = json_segs
-                if cam_role: cams[key] = cam_role
-
-        out = {'name': name, 'hash': ahash, 'duration': dur, 'settings': settings_out, 'streams': final_streams, 'cameras': cams, 'events': sorted(events, key=lambda x: x['tick'])}
-        with open(os.path.join(config.OUT_DIR, f"{ahash}.json"), 'w') as f: json.dump(out, f)
-
-    manifest['neededParts'] = {k: sorted(list(v)) for k, v in part_usage.items() if v}
-    with open(os.path.join(config.OUT_DIR, "manifest.json"), 'w') as f: json.dump(manifest, f, indent=2)
+    BAKE_CANCELLED = False
+    document.getElementById("btnBake").disabled = True
+    document.getElementById("btnCancel").disabled = False
+
+    gen = bake([ANIM_CACHE[n] for n in sel], config.OUT_DIR)
+    try:
+        async for p in gen:
+            if BAKE_CANCELLED: break
+            if p['stream'] is None:
+                log(f"{p['anim']} ({p['animations']}/{p['total']}, {p['segments']} segments, {p['bytes']} bytes)")
+    finally:
+        await gen.aclose()
+        document.getElementById("btnBake").disabled = False
+        document.getElementById("btnCancel").disabled = True
+
+    if BAKE_CANCELLED: return log("Bake cancelled.")
 
     log("Zipping...")
     shutil.make_archive("results", 'zip', config.OUT_DIR)